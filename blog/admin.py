@@ -1,34 +1,80 @@
 from django.contrib import admin
-from blog.models import Post, Tag, Comment, User
-
-
-class LikesInline(admin.TabularInline):
-    model = Post.likes.through
-    raw_id_fields = ('user',)
-    extra = 1
+from django.urls import reverse
+from django.utils.html import format_html
+from blog.likes import apply_like_events
+from blog.models import Post, PostLike, Tag, Comment
 
 
 @admin.register(Post)
 class AdminPost(admin.ModelAdmin):
-    raw_id_field = ('tags', 'author', 'likes')
-    list_display = ('title', 'author')
+    list_display = (
+        'title', 'author', 'published_at', 'likes_count', 'comments_count',
+    )
+    list_select_related = ('author',)
+    search_fields = ('=slug', 'title')
+    # виджеты подгружают варианты по запросу, а не все записи сразу;
+    # автора выбираем через raw_id: автокомплит Django 3.1 не учитывает
+    # limit_choices_to и предложил бы любого пользователя
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('tags',)
+    readonly_fields = ('likes_link', 'comments_count')
     fields = (
         'title', 'text', 'slug', 'image',
         'published_at', 'author', 'tags',
-        'likes',  # many times for likes
+        'likes_link', 'comments_count',
     )
+    show_full_result_count = False
 
-    # inlines = [LikesInline] # similar queries for every user, more speed - more queries
+    def likes_link(self, post):
+        # лайки правятся постранично в своём разделе, см. AdminPostLike
+        url = reverse('admin:blog_postlike_changelist')
+        return format_html(
+            '<a href="{}?post__id__exact={}">{}</a>',
+            url, post.pk, post.likes_count,
+        )
+    likes_link.short_description = 'Лайки'
 
 
 @admin.register(Tag)
 class AdminTag(admin.ModelAdmin):
-    list_display = ('title', 'id')
-    pass
+    list_display = ('title', 'posts_count', 'id')
+    search_fields = ('title',)
 
 
 @admin.register(Comment)
 class AdminComment(admin.ModelAdmin):
-    list_display = ('post', 'author')
+    list_display = ('post', 'author', 'published_at')
+    list_select_related = ('post', 'author')
     raw_id_fields = ('post', 'author')
+    show_full_result_count = False
+
+
+@admin.register(PostLike)
+class AdminPostLike(admin.ModelAdmin):
+    '''
+    Likes of posts page by page. Rows of the through table are written
+    by apply_like_events, so that likes_count and cached pages follow.
+    '''
+    list_display = ('post', 'user', 'liked_at')
+    list_select_related = ('post', 'user')
+    raw_id_fields = ('post', 'user')
+    search_fields = ('=post__slug', '=user__username')
+    show_full_result_count = False
+
+    def has_change_permission(self, request, obj=None):
+        # лайк можно только поставить или снять
+        return False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # лайк уже записан, apply_like_events пересчитает счётчик и кэш
+        apply_like_events({(obj.post_id, obj.user_id): True})
+
+    def delete_model(self, request, obj):
+        apply_like_events({(obj.post_id, obj.user_id): False})
 
+    def delete_queryset(self, request, queryset):
+        apply_like_events({
+            pair: False
+            for pair in queryset.values_list('post_id', 'user_id')
+        })
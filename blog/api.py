@@ -0,0 +1,113 @@
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import conditional_page, require_GET
+
+from blog.database import read_from_replica
+from blog.models import Post, Tag
+from blog.pagination import paginate_posts
+from blog.serializers import POST_FIELDS, serialize_post_fields
+from blog.views import post_comments
+
+
+API_POSTS_PER_PAGE = 20
+POST_LIST_FIELDS = [
+    'title', 'slug', 'teaser_text', 'author', 'comments_amount',
+    'image_url', 'image_thumbnail_url', 'image_srcset', 'image_webp_srcset',
+    'published_at', 'tags',
+]
+POST_DETAIL_FIELDS = [
+    'title', 'slug', 'text', 'author', 'comments_amount', 'likes_amount',
+    'image_url', 'image_srcset', 'image_webp_srcset', 'published_at', 'tags',
+]
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def api_view(view):
+    '''
+    GET only, ETag with 304 answers, gzip and replica reads for JSON views
+    '''
+    return gzip_page(conditional_page(require_GET(read_from_replica(view))))
+
+
+def parse_fields(request, default_fields):
+    '''
+    Sparse fieldset from ?fields=title,slug
+    '''
+    raw_fields = request.GET.get('fields')
+    if not raw_fields:
+        return default_fields
+
+    fields = [
+        field.strip() for field in raw_fields.split(',') if field.strip()
+    ]
+    unknown_fields = set(fields) - set(POST_FIELDS)
+    if unknown_fields:
+        raise InvalidFields(
+            'Unknown fields: {}'.format(', '.join(sorted(unknown_fields))))
+    return fields
+
+
+def narrow_posts(posts, fields):
+    '''
+    Load only the columns and relations needed for the fields
+    '''
+    columns = {
+        column for field in fields for column in POST_FIELDS[field][0]
+    }
+    posts = posts.only(*columns)
+    if 'author__username' in columns:
+        posts = posts.select_related('author')
+    if 'tags' in fields:
+        posts = posts.prefetch_tags()
+    return posts
+
+
+def build_posts_response(request, posts):
+    try:
+        fields = parse_fields(request, POST_LIST_FIELDS)
+    except InvalidFields as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    page_posts, next_cursor, previous_cursor = paginate_posts(
+        posts,
+        API_POSTS_PER_PAGE,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    page_posts = narrow_posts(page_posts, fields)
+
+    return JsonResponse({
+        'posts': [serialize_post_fields(post, fields) for post in page_posts],
+        'next_cursor': next_cursor,
+        'previous_cursor': previous_cursor,
+    })
+
+
+@api_view
+def posts_list(request):
+    return build_posts_response(request, Post.objects.all())
+
+
+@api_view
+def tag_posts_list(request, tag_title):
+    tag = get_object_or_404(Tag.objects.all(), title=tag_title)
+    return build_posts_response(request, tag.posts.all())
+
+
+@api_view
+def post_detail(request, slug):
+    try:
+        fields = parse_fields(request, POST_DETAIL_FIELDS)
+    except InvalidFields as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    post = get_object_or_404(
+        narrow_posts(Post.objects.all(), fields), slug=slug)
+    return JsonResponse(serialize_post_fields(post, fields))
+
+
+comments_list = api_view(post_comments)
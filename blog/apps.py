@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        import blog.database  # noqa: F401
+        import blog.metrics  # noqa: F401
+        import blog.signals  # noqa: F401
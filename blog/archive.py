@@ -0,0 +1,32 @@
+import datetime
+
+from django.utils import timezone
+
+
+def get_archive_bounds(year, month=None):
+    '''
+    Half-open range of the year or month in the current time zone
+    :return: (start, end) aware datetimes
+    '''
+    if month is None:
+        start = datetime.datetime(year, 1, 1)
+        end = datetime.datetime(year + 1, 1, 1)
+    else:
+        start = datetime.datetime(year, month, 1)
+        end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def get_archive_month(published_at):
+    '''
+    :return: (year, month) of the post in the current time zone
+    '''
+    published_at = timezone.localtime(published_at)
+    return published_at.year, published_at.month
+
+
+def is_valid_archive_date(year, month=None):
+    # у следующего года тоже должна быть дата
+    if not datetime.MINYEAR <= year < datetime.MAXYEAR:
+        return False
+    return month is None or 1 <= month <= 12
@@ -0,0 +1,75 @@
+import asyncio
+
+from django.shortcuts import render
+
+from blog.concurrency import run_in_thread
+from blog.database import read_from_replica
+from blog.sidebar import get_sidebar_async
+from blog.views import (
+    cache_archive_page, cache_index_page, cache_post_page, cache_tag_page,
+    fetch_archive_posts, fetch_comments_page, fetch_index_posts,
+    fetch_is_liked, fetch_post, fetch_related_posts, fetch_tag_posts,
+    serialize_post_details,
+)
+
+
+# Те же страницы, что и в blog.views, но независимые запросы к базе
+# идут параллельно в пуле потоков. Подключаются под ASGI, см. ASYNC_VIEWS.
+
+
+@read_from_replica
+@cache_index_page
+async def index(request, page=1):
+    sidebar, posts_context = await asyncio.gather(
+        get_sidebar_async(),
+        run_in_thread(fetch_index_posts, request, page),
+    )
+    context = {**sidebar, **posts_context}
+    return await run_in_thread(render, request, 'index.html', context)
+
+
+@read_from_replica
+@cache_post_page
+async def post_detail(request, slug):
+    sidebar, post = await asyncio.gather(
+        get_sidebar_async(),
+        run_in_thread(fetch_post, slug),
+    )
+    comments_page, is_liked, related_posts = await asyncio.gather(
+        run_in_thread(
+            fetch_comments_page,
+            post.id,
+            after=request.GET.get('comments_after'),
+        ),
+        run_in_thread(fetch_is_liked, request, post.id),
+        run_in_thread(fetch_related_posts, post.id),
+    )
+
+    context = {
+        **sidebar,
+        'post': serialize_post_details(post, comments_page, is_liked),
+        'related_posts': related_posts,
+    }
+    return await run_in_thread(render, request, 'post-details.html', context)
+
+
+@read_from_replica
+@cache_tag_page
+async def tag_filter(request, tag_title, page=1):
+    sidebar, posts_context = await asyncio.gather(
+        get_sidebar_async(),
+        run_in_thread(fetch_tag_posts, request, tag_title, page),
+    )
+    context = {**sidebar, **posts_context}
+    return await run_in_thread(render, request, 'posts-list.html', context)
+
+
+@read_from_replica
+@cache_archive_page
+async def archive(request, year, month=None, page=1):
+    sidebar, posts_context = await asyncio.gather(
+        get_sidebar_async(),
+        run_in_thread(fetch_archive_posts, request, year, month, page),
+    )
+    context = {**sidebar, **posts_context}
+    return await run_in_thread(render, request, 'posts-list.html', context)
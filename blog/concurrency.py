@@ -0,0 +1,25 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+def call_with_own_connections(func, *args, **kwargs):
+    '''
+    Run func in a pool thread, which has its own database connections
+    '''
+    try:
+        # запросы попадут в метрики через blog.metrics.record_current_query
+        return func(*args, **kwargs)
+    finally:
+        # конец запроса закрывает соединения только в потоке запроса
+        close_old_connections()
+
+
+async def run_in_thread(func, *args, **kwargs):
+    '''
+    Await a blocking call without holding the event loop.
+    Unlike the default sync_to_async, calls are not serialized
+    through one thread, so independent queries run concurrently.
+    '''
+    return await sync_to_async(
+        call_with_own_connections, thread_sensitive=False,
+    )(func, *args, **kwargs)
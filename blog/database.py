@@ -0,0 +1,82 @@
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+REPLICA_DATABASE = 'replica'
+# сессии и пользователи читаются из основной базы: в копии их может не быть
+REPLICA_APP_LABELS = {'blog'}
+
+replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias == REPLICA_DATABASE:
+        # копию перезаписывает только sync_replica
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def use_replica():
+    '''
+    Read blog models from the replica inside the block, if one is configured
+    '''
+    token = replica_reads.set(True)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def read_from_replica(view):
+    '''
+    For read-only views, which can show data a few minutes old.
+    Works for both sync and async views.
+    '''
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # потоки run_in_thread получают копию контекста с флагом
+            with use_replica():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    '''
+    Sends reads of blog models inside read_from_replica views
+    to the replica database, a copy made by the sync_replica command
+    '''
+
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() \
+                and model._meta.app_label in REPLICA_APP_LABELS:
+            return REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DATABASE
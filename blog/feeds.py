@@ -0,0 +1,94 @@
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from blog.database import read_from_replica
+from blog.models import Post, Tag
+from blog.page_cache import cache_page_for_anonymous
+
+
+FEED_POSTS_COUNT = 20
+
+
+def fetch_feed_posts(posts):
+    return posts.order_by('-published_at', '-id')\
+        .defer('text')\
+        .select_related('author')\
+        .prefetch_tags()[:FEED_POSTS_COUNT]
+
+
+class LatestPostsFeed(Feed):
+    title = 'Sensive Blog'
+    description = 'Новые посты блога'
+
+    def link(self):
+        return reverse('index')
+
+    def items(self):
+        return fetch_feed_posts(Post.objects.all())
+
+    def item_title(self, post):
+        return post.title
+
+    def item_description(self, post):
+        return post.teaser
+
+    def item_link(self, post):
+        return reverse('post_detail', kwargs={'slug': post.slug})
+
+    def item_author_name(self, post):
+        return post.author.username
+
+    def item_pubdate(self, post):
+        return post.published_at
+
+    def item_categories(self, post):
+        return [tag.title for tag in post.tags_]
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class TagPostsFeed(LatestPostsFeed):
+    def get_object(self, request, tag_title):
+        return get_object_or_404(Tag.objects.all(), title=tag_title)
+
+    def title(self, tag):
+        return f'Sensive Blog: #{tag.title}'
+
+    def description(self, tag):
+        return f'Новые посты с тегом #{tag.title}'
+
+    def link(self, tag):
+        return reverse('tag_filter', kwargs={'tag_title': tag.title})
+
+    def items(self, tag):
+        return fetch_feed_posts(tag.posts.all())
+
+
+class TagPostsAtomFeed(TagPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, tag):
+        return self.description(tag)
+
+
+# ленты сбрасываются вместе со страницами, которые показывают те же посты,
+# а читатели лент получают 304 прямо из кэша
+cache_feed = cache_page_for_anonymous(
+    get_groups=lambda **kwargs: ['index'],
+    get_last_modified=lambda **kwargs: Post.objects.fetch_last_updated_at(),
+)
+cache_tag_feed = cache_page_for_anonymous(
+    get_groups=lambda tag_title: [f'tag:{tag_title}'],
+    get_last_modified=lambda tag_title: Post.objects
+    .filter(tags__title=tag_title).fetch_last_updated_at(),
+)
+
+latest_posts_feed = read_from_replica(cache_feed(LatestPostsFeed()))
+latest_posts_atom_feed = read_from_replica(cache_feed(LatestPostsAtomFeed()))
+tag_posts_feed = read_from_replica(cache_tag_feed(TagPostsFeed()))
+tag_posts_atom_feed = read_from_replica(cache_tag_feed(TagPostsAtomFeed()))
@@ -0,0 +1,153 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.models import Q
+
+from blog.models import Post, count_subquery
+from blog.page_cache import invalidate_page_groups
+from blog.signals import mark_posts_changed
+from blog.sidebar import invalidate_sidebar
+
+
+logger = logging.getLogger(__name__)
+
+LOCKED_RETRIES = 5
+LOCKED_RETRY_DELAY = 0.05
+
+like_events = queue.Queue(maxsize=settings.LIKES_QUEUE_SIZE)
+flusher_lock = threading.Lock()
+flusher = None
+
+
+def enqueue_like(post_id, user_id, liked):
+    '''
+    Remember a like or unlike, it is written by the flusher thread
+    :raises queue.Full: too many unsaved events
+    '''
+    start_flusher()
+    like_events.put_nowait((post_id, user_id, liked))
+
+
+def collect_events(first_event):
+    '''
+    Wait up to the flush interval for more events
+    :return: (dict {(post id, user id): liked}, number of taken events),
+             the last event of a pair wins
+    '''
+    post_id, user_id, liked = first_event
+    events = {(post_id, user_id): liked}
+    taken_count = 1
+    deadline = time.monotonic() + settings.LIKES_FLUSH_INTERVAL
+    while taken_count < settings.LIKES_BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            post_id, user_id, liked = like_events.get(timeout=timeout)
+        except queue.Empty:
+            break
+        events[(post_id, user_id)] = liked
+        taken_count += 1
+    return events, taken_count
+
+
+def apply_like_events(events):
+    '''
+    Write a batch of likes in one short transaction.
+    Only writes happen inside, so SQLite takes the write lock once
+    and never upgrades a read lock.
+    '''
+    PostLike = Post.likes.through
+    likes = [pair for pair, liked in events.items() if liked]
+    unliked_user_ids = defaultdict(list)
+    for (post_id, user_id), liked in events.items():
+        if not liked:
+            unliked_user_ids[post_id].append(user_id)
+    post_ids = {post_id for post_id, _ in events}
+
+    with transaction.atomic():
+        if unliked_user_ids:
+            unlikes_filter = Q()
+            for post_id, user_ids in unliked_user_ids.items():
+                unlikes_filter |= Q(post_id=post_id, user_id__in=user_ids)
+            PostLike.objects.filter(unlikes_filter).delete()
+        PostLike.objects.bulk_create(
+            [
+                PostLike(post_id=post_id, user_id=user_id)
+                for post_id, user_id in likes
+            ],
+            ignore_conflicts=True,
+        )
+        # повторные лайки отброшены молча, поэтому счётчик пересчитываем
+        Post.objects.filter(id__in=post_ids).update(
+            likes_count=count_subquery(PostLike.objects.all(), 'post_id'))
+        mark_posts_changed(post_ids)
+
+    # админка вызывает функцию внутри своей транзакции,
+    # кэш сбрасываем только после её коммита
+    groups = [
+        f'post:{slug}' for slug in
+        Post.objects.filter(id__in=post_ids).values_list('slug', flat=True)
+    ]
+    transaction.on_commit(lambda: invalidate_page_groups(groups))
+    transaction.on_commit(invalidate_sidebar)
+
+
+def flush_events(events):
+    for attempt in range(LOCKED_RETRIES):
+        try:
+            apply_like_events(events)
+            return
+        except OperationalError:
+            # база занята другим процессом, пробуем ещё раз чуть позже
+            if attempt == LOCKED_RETRIES - 1:
+                logger.exception('%s like events were lost', len(events))
+                return
+            time.sleep(LOCKED_RETRY_DELAY * 2 ** attempt)
+        except Exception:
+            # например, пользователя удалили, пока лайк ждал в очереди
+            logger.exception('%s like events were lost', len(events))
+            return
+
+
+def run_flusher():
+    while True:
+        events, taken_count = collect_events(like_events.get())
+        close_old_connections()
+        flush_events(events)
+        for _ in range(taken_count):
+            like_events.task_done()
+
+
+def flush_pending_events():
+    '''
+    Write the rest of the queue in the calling thread, e.g. on shutdown
+    '''
+    events = {}
+    while True:
+        try:
+            post_id, user_id, liked = like_events.get_nowait()
+        except queue.Empty:
+            break
+        events[(post_id, user_id)] = liked
+        like_events.task_done()
+    if events:
+        flush_events(events)
+
+
+def start_flusher():
+    global flusher
+    if flusher is not None:
+        return
+    with flusher_lock:
+        if flusher is None:
+            flusher = threading.Thread(
+                target=run_flusher, name='likes-flusher', daemon=True)
+            flusher.start()
+            atexit.register(flush_pending_events)
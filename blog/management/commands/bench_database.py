@@ -0,0 +1,231 @@
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    OperationalError, close_old_connections, connection, connections,
+    transaction,
+)
+from django.utils import timezone
+
+from blog.database import use_replica
+from blog.management.commands.bench_views import percentile
+from blog.models import Comment, Post
+from blog.sidebar import build_sidebar
+from blog.views import fetch_comments_page, fetch_post
+
+
+BENCH_COMMENT_TEXT = 'bench_database'
+
+
+def read_post_page(slug):
+    '''
+    Queries of a post page without the page cache
+    '''
+    with use_replica():
+        post = fetch_post(slug)
+        fetch_comments_page(post.id)
+        build_sidebar()
+
+
+def write_comment(post_id, author_id, created_comment_ids):
+    with transaction.atomic():
+        comment = Comment.objects.create(
+            post_id=post_id,
+            author_id=author_id,
+            text=BENCH_COMMENT_TEXT,
+            published_at=timezone.now(),
+        )
+    created_comment_ids.append(comment.id)
+
+
+def delete_comments(comment_ids, batch_size=500):
+    # удаляем через ORM, чтобы сигналы поправили счётчики постов
+    for start in range(0, len(comment_ids), batch_size):
+        batch_ids = comment_ids[start:start + batch_size]
+        for comment in Comment.objects.filter(id__in=batch_ids):
+            comment.delete()
+
+
+class LoadWorker(threading.Thread):
+    def __init__(self, operation, make_args, deadline):
+        super().__init__(daemon=True)
+        self.operation = operation
+        self.make_args = make_args
+        self.deadline = deadline
+        self.latencies = []
+        self.errors_count = 0
+
+    def run(self):
+        try:
+            while time.monotonic() < self.deadline:
+                started_at = time.perf_counter()
+                try:
+                    self.operation(*self.make_args())
+                except OperationalError as error:
+                    # запрос не дождался блокировки базы за busy timeout
+                    if 'locked' not in str(error):
+                        raise
+                    self.errors_count += 1
+                else:
+                    self.latencies.append(
+                        (time.perf_counter() - started_at) * 1000)
+                # граница запроса: соединение закрывается, если
+                # CONN_MAX_AGE не разрешает его переиспользовать
+                close_old_connections()
+        finally:
+            connections.close_all()
+
+
+def summarize(workers, duration):
+    latencies = [
+        latency for worker in workers for latency in worker.latencies
+    ]
+    summary = {
+        'per_second': round(len(latencies) / duration, 1),
+        'p50_ms': None,
+        'p95_ms': None,
+        'errors': sum(worker.errors_count for worker in workers),
+    }
+    if latencies:
+        summary['p50_ms'] = round(percentile(latencies, 50), 2)
+        summary['p95_ms'] = round(percentile(latencies, 95), 2)
+    return summary
+
+
+class Command(BaseCommand):
+    help = 'Measure database throughput under concurrent reads and writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=8,
+            help='Threads reading post pages',
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=2,
+            help='Threads writing comments',
+        )
+        parser.add_argument(
+            '--allow-writes',
+            action='store_true',
+            help='Let writers create comments in the database; run it '
+                 'against a copy set by DATABASE_FILEPATH',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Seconds to run the load',
+        )
+        parser.add_argument('--output', help='Write results to a JSON file')
+        parser.add_argument(
+            '--compare',
+            help='JSON file of a previous run to compare with',
+        )
+
+    def handle(self, *args, **options):
+        if options['writers'] and not options['allow_writes']:
+            raise CommandError(
+                'Писатели создают комментарии в базе DATABASE_FILEPATH: '
+                'запустите команду на копии базы с --allow-writes '
+                'или без писателей, --writers 0')
+
+        slugs = list(Post.objects.values_list('slug', flat=True)[:1000])
+        post_ids = list(Post.objects.values_list('id', flat=True)[:1000])
+        author_ids = list(User.objects.values_list('id', flat=True)[:1000])
+        if not slugs or not author_ids:
+            self.stderr.write('Заполните базу, например командой seed_blog')
+            return
+
+        deadline = time.monotonic() + options['duration']
+        readers = [
+            LoadWorker(
+                read_post_page,
+                lambda: (random.choice(slugs),),
+                deadline,
+            )
+            for _ in range(options['readers'])
+        ]
+        # list.append атомарен, потокам хватает общего списка
+        created_comment_ids = []
+        writers = [
+            LoadWorker(
+                write_comment,
+                lambda: (
+                    random.choice(post_ids),
+                    random.choice(author_ids),
+                    created_comment_ids,
+                ),
+                deadline,
+            )
+            for _ in range(options['writers'])
+        ]
+        started_at = time.monotonic()
+        try:
+            for worker in readers + writers:
+                worker.start()
+            for worker in readers + writers:
+                worker.join()
+            duration = time.monotonic() - started_at
+        finally:
+            # удаляются только созданные комментарии, но updated_at
+            # постов и сброшенный кэш страниц не возвращаются
+            delete_comments(created_comment_ids)
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode, = cursor.fetchone()
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'journal_mode': journal_mode,
+            'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+            'replica': 'replica' in settings.DATABASES,
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'reads': summarize(readers, duration),
+            'writes': summarize(writers, duration),
+        }
+
+        self.print_report(report)
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.print_comparison(json.load(file), report)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'journal_mode={report["journal_mode"]}, '
+            f'CONN_MAX_AGE={report["conn_max_age"]}, '
+            f'replica={report["replica"]}')
+        self.stdout.write(
+            f'{"":<10}{"per s":>10}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"errors":>10}')
+        for kind in ('reads', 'writes'):
+            result = report[kind]
+            self.stdout.write(
+                f'{kind:<10}{result["per_second"]:>10}'
+                f'{str(result["p50_ms"]):>10}{str(result["p95_ms"]):>10}'
+                f'{result["errors"]:>10}')
+
+    def print_comparison(self, previous_report, report):
+        self.stdout.write('\nChange against the previous run:')
+        for kind in ('reads', 'writes'):
+            changes = []
+            for metric in ('per_second', 'p50_ms', 'p95_ms'):
+                previous_value = previous_report[kind][metric]
+                value = report[kind][metric]
+                if not previous_value or value is None:
+                    continue
+                change = (value - previous_value) / previous_value
+                changes.append(f'{metric} {change:+.0%}')
+            self.stdout.write(f'{kind:<10}' + ', '.join(changes))
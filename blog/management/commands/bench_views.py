@@ -0,0 +1,260 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.metrics import RequestMetrics, current_metrics
+from blog.models import ArchiveMonth, Post, Tag
+from blog.pagination import encode_cursor
+from blog.views import POSTS_PER_PAGE
+
+
+DEEP_PAGES = [2, 10, 100, 1000]
+DEBUG_TOOLBAR_MIDDLEWARE = 'debug_toolbar.middleware.DebugToolbarMiddleware'
+
+
+def build_page_url(page):
+    '''
+    Index page reached through the seek cursor, as the site links do
+    '''
+    offset = (page - 1) * POSTS_PER_PAGE - 1
+    key = Post.objects.order_by('-published_at', '-id')\
+        .values_list('published_at', 'id')[offset:offset + 1]\
+        .first()
+    if key is None:
+        return None
+    path = reverse('index', kwargs={'page': page})
+    return f'{path}?after={encode_cursor(*key)}'
+
+
+def collect_urls():
+    urls = {'index': reverse('index')}
+    for page in DEEP_PAGES:
+        page_url = build_page_url(page)
+        if page_url:
+            urls[f'index_page_{page}'] = page_url
+
+    popular_slug = Post.objects.popular()\
+        .values_list('slug', flat=True)\
+        .first()
+    if popular_slug:
+        urls['post_detail'] = reverse(
+            'post_detail', kwargs={'slug': popular_slug})
+
+    popular_tag = Tag.objects.popular()\
+        .values_list('title', flat=True)\
+        .first()
+    if popular_tag:
+        urls['tag_filter'] = reverse(
+            'tag_filter', kwargs={'tag_title': popular_tag})
+
+    latest_month = ArchiveMonth.objects.filter(posts_count__gt=0).first()
+    if latest_month:
+        urls['archive_year'] = reverse(
+            'archive', kwargs={'year': latest_month.year})
+        urls['archive_month'] = reverse('archive', kwargs={
+            'year': latest_month.year,
+            'month': latest_month.month,
+        })
+    return urls
+
+
+def percentile(latencies, percent):
+    if len(latencies) == 1:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100)[percent - 1]
+
+
+def run_wsgi_load(url, requests, concurrency, warm_cache):
+    '''
+    :return: (latencies in ms, elapsed seconds)
+    '''
+    clients = threading.local()
+
+    def send(_):
+        if not hasattr(clients, 'client'):
+            clients.client = Client()
+        if not warm_cache:
+            cache.clear()
+        started_at = time.perf_counter()
+        response = clients.client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        return (time.perf_counter() - started_at) * 1000
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(send, range(requests)))
+    return latencies, time.perf_counter() - started_at
+
+
+async def get_async(url):
+    return await AsyncClient().get(url)
+
+
+async def run_asgi_load(url, requests, concurrency, warm_cache):
+    '''
+    :return: (latencies in ms, elapsed seconds)
+    '''
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send():
+        async with semaphore:
+            if not warm_cache:
+                cache.clear()
+            started_at = time.perf_counter()
+            response = await client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            return (time.perf_counter() - started_at) * 1000
+
+    started_at = time.perf_counter()
+    latencies = await asyncio.gather(*[send() for _ in range(requests)])
+    return latencies, time.perf_counter() - started_at
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, query count and peak memory of the blog views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Requests per view',
+        )
+        parser.add_argument(
+            '--warm-cache',
+            action='store_true',
+            help='Keep the sidebar and page caches between requests',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Requests in flight at once',
+        )
+        parser.add_argument(
+            '--asgi',
+            action='store_true',
+            help='Send requests through the ASGI handler instead of WSGI',
+        )
+        parser.add_argument('--output', help='Write results to a JSON file')
+        parser.add_argument(
+            '--compare',
+            help='JSON file of a previous run to compare with',
+        )
+
+    def handle(self, *args, **options):
+        test_settings = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            REQUEST_METRICS_SAMPLE_RATE=0,
+            # с DEBUG=True тулбар пишет каждый SQL-запрос и съедает
+            # большую часть времени ответа, замеры были бы о нём
+            MIDDLEWARE=[
+                middleware for middleware in settings.MIDDLEWARE
+                if middleware != DEBUG_TOOLBAR_MIDDLEWARE
+            ],
+        )
+        with test_settings:
+            results = {
+                name: self.bench_url(url, options)
+                for name, url in collect_urls().items()
+            }
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'requests': options['requests'],
+            'warm_cache': options['warm_cache'],
+            'concurrency': options['concurrency'],
+            'handler': 'asgi' if options['asgi'] else 'wsgi',
+            'async_views': settings.ASYNC_VIEWS,
+            'posts': Post.objects.count(),
+            'results': results,
+        }
+        self.print_report(report)
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.print_comparison(json.load(file), report)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def bench_url(self, url, options):
+        load_args = (
+            url,
+            options['requests'],
+            options['concurrency'],
+            options['warm_cache'],
+        )
+        if options['asgi']:
+            latencies, elapsed = asyncio.run(run_asgi_load(*load_args))
+        else:
+            latencies, elapsed = run_wsgi_load(*load_args)
+
+        # запросы и память меряем отдельно, чтобы не искажать время;
+        # current_metrics видят и потоки асинхронных вьюх
+        if not options['warm_cache']:
+            cache.clear()
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        tracemalloc.start()
+        try:
+            if options['asgi']:
+                async_to_sync(get_async)(url)
+            else:
+                Client().get(url)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            current_metrics.reset(token)
+
+        return {
+            'url': url,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'rps': round(len(latencies) / elapsed, 1),
+            'queries': metrics.queries_count,
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"view":<20}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+            f'{"rps":>10}{"queries":>10}{"peak KB":>12}')
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f'{name:<20}{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+                f'{result["p99_ms"]:>10}{result["rps"]:>10}'
+                f'{result["queries"]:>10}'
+                f'{result["peak_memory_kb"]:>12}')
+
+    def print_comparison(self, previous_report, report):
+        self.stdout.write('\nChange against the previous run:')
+        for name, result in report['results'].items():
+            previous_result = previous_report['results'].get(name)
+            if not previous_result:
+                continue
+            changes = []
+            for metric in ('p50_ms', 'p95_ms', 'rps', 'queries',
+                           'peak_memory_kb'):
+                # в старых отчётах rps нет
+                previous_value = previous_result.get(metric)
+                if not previous_value:
+                    continue
+                change = (result[metric] - previous_value) / previous_value
+                changes.append(f'{metric} {change:+.0%}')
+            self.stdout.write(f'{name:<20}' + ', '.join(changes))
@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.staticfiles import STATIC_BUNDLES, BundledStaticFilesStorage
+
+
+# исходники и документация шаблона в сборку не попадают
+IGNORE_PATTERNS = ['scss', 'Sensive Blog -doc', 'Thumbs.db', '*.map']
+
+
+class Command(BaseCommand):
+    help = 'Build bundled, hashed and precompressed static files ' \
+        'into STATIC_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove previously built files first',
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(staticfiles_storage, BundledStaticFilesStorage):
+            raise CommandError(
+                'Set STATIC_MANIFEST_STORAGE=True to build hashed files')
+        started_at = time.monotonic()
+        call_command(
+            'collectstatic',
+            interactive=False,
+            clear=options['clear'],
+            ignore_patterns=IGNORE_PATTERNS,
+            verbosity=options['verbosity'],
+        )
+
+        for bundle_name in STATIC_BUNDLES:
+            hashed_name = staticfiles_storage.stored_name(bundle_name)
+            sizes = [f'{self.get_size_kb(hashed_name)} KB']
+            for extension in ('.gz', '.br'):
+                size_kb = self.get_size_kb(hashed_name + extension)
+                if size_kb is not None:
+                    sizes.append(f'{extension} {size_kb} KB')
+            self.stdout.write(f'{hashed_name}: {", ".join(sizes)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Static files built in {time.monotonic() - started_at:.1f} s'))
+
+    def get_size_kb(self, name):
+        path = staticfiles_storage.path(name)
+        if not os.path.exists(path):
+            return None
+        return round(os.path.getsize(path) / 1024, 1)
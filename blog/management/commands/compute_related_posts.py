@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.page_cache import invalidate_page_groups
+from blog.related import compute_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Precompute related posts by shared tags and co-likes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only posts whose tags or likes changed since the last run',
+        )
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        post_ids = compute_related_posts(incremental=options['incremental'])
+
+        slugs = Post.objects.filter(id__in=post_ids)\
+            .values_list('slug', flat=True)\
+            .iterator()
+        invalidate_page_groups(f'post:{slug}' for slug in slugs)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Related posts computed for {len(post_ids)} posts '
+            f'in {time.monotonic() - started_at:.1f} s'
+        ))
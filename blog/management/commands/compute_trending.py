@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.sidebar import invalidate_sidebar
+from blog.trending import compute_trending
+
+
+class Command(BaseCommand):
+    help = 'Rank posts by likes and comments decayed with time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only posts with new likes or comments since the last run',
+        )
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        post_ids = compute_trending(incremental=options['incremental'])
+        if post_ids:
+            invalidate_sidebar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Trending scores computed for {len(post_ids)} posts '
+            f'in {time.monotonic() - started_at:.1f} s'
+        ))
@@ -0,0 +1,135 @@
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from blog.management.commands.bench_views import collect_urls
+from blog.models import Post
+
+
+# обход по индексу в нужном порядке тоже SCAN, но с LIMIT он короткий
+INDEXED_SCAN_MARKERS = ('USING INDEX', 'USING COVERING INDEX',
+                        'USING INTEGER PRIMARY KEY', 'VIRTUAL TABLE',
+                        'CONSTANT ROW')
+
+
+def collect_view_urls():
+    '''
+    Blog pages from bench_views plus search, the feed and the JSON API
+    '''
+    urls = collect_urls()
+    urls['search'] = reverse('search') + '?q=post'
+    urls['api_posts'] = reverse('api_posts')
+    urls['feed'] = reverse('feed')
+
+    slug = Post.objects.values_list('slug', flat=True).first()
+    if slug:
+        urls['api_post_detail'] = reverse(
+            'api_post_detail', kwargs={'slug': slug})
+        urls['post_comments'] = reverse(
+            'post_comments', kwargs={'slug': slug})
+    return urls
+
+
+def classify_plan_line(line):
+    '''
+    :return: 'scan' for a full table scan, 'sort' for sorting in a temp
+             b-tree, None for index lookups
+    '''
+    line = line.strip()
+    if line.startswith('SCAN ') \
+            and not any(marker in line for marker in INDEXED_SCAN_MARKERS):
+        return 'scan'
+    if line.startswith('USE TEMP B-TREE'):
+        return 'sort'
+    return None
+
+
+def explain_query(alias, sql):
+    '''
+    :return: list of EXPLAIN QUERY PLAN lines, nested steps are indented
+    '''
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        rows = cursor.fetchall()
+
+    depths = {0: -1}
+    plan = []
+    for step_id, parent_id, _, detail in rows:
+        depths[step_id] = depths.get(parent_id, -1) + 1
+        plan.append('  ' * depths[step_id] + detail)
+    return plan
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN QUERY PLAN of every query the blog views issue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan',
+            action='store_true',
+            help='Exit with an error if any query scans a whole table',
+        )
+        parser.add_argument(
+            '--slow-only',
+            action='store_true',
+            help='Print only queries with table scans or temp b-tree sorts',
+        )
+
+    def handle(self, *args, **options):
+        test_settings = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            REQUEST_METRICS_SAMPLE_RATE=0,
+        )
+        problems_count = Counter()
+        with test_settings:
+            for name, url in collect_view_urls().items():
+                problems_count += self.explain_url(name, url, options)
+
+        self.stdout.write(
+            f'\n{problems_count["scan"]} queries scan whole tables, '
+            f'{problems_count["sort"]} sort in a temp b-tree')
+        if problems_count['scan'] and options['fail_on_scan']:
+            raise CommandError('Some queries scan whole tables')
+
+    def explain_url(self, name, url, options):
+        '''
+        :return: Counter of queries by problem, see classify_plan_line
+        '''
+        # страница из кэша не покажет ни одного запроса
+        cache.clear()
+        with ExitStack() as stack:
+            captured_queries = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            }
+            response = Client().get(url)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{name} {url} -> {response.status_code}'))
+        problems_count = Counter()
+        for alias, queries in captured_queries.items():
+            for query in queries:
+                plan = explain_query(alias, query['sql'])
+                problems = {classify_plan_line(line) for line in plan}
+                problems.discard(None)
+                problems_count.update(problems)
+                if options['slow_only'] and not problems:
+                    continue
+
+                self.stdout.write(f'  [{alias}] {query["sql"]}')
+                for line in plan:
+                    problem = classify_plan_line(line)
+                    style = {
+                        'scan': self.style.ERROR,
+                        'sort': self.style.WARNING,
+                    }.get(problem, str)
+                    self.stdout.write(style(f'      {line}'))
+        return problems_count
@@ -0,0 +1,306 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blog.archive import get_archive_month
+from blog.models import Post, Tag
+from blog.pagination import encode_cursor
+from blog.views import (
+    ARCHIVE_POSTS_PER_PAGE, POSTS_PER_PAGE, TAG_POSTS_PER_PAGE,
+)
+
+
+MANIFEST_FILENAME = '.export-manifest.json'
+PAGES_PER_TASK = 50
+
+
+def get_page_filepath(output_dir, path):
+    relative_path = path.strip('/')
+    if not relative_path or path.endswith('/'):
+        relative_path = os.path.join(relative_path, 'index')
+    return os.path.join(output_dir, f'{relative_path}.html')
+
+
+def render_pages(pages, output_dir):
+    '''
+    Render (path, url) pairs with the blog views and write them to disk
+    :return: number of rendered pages
+    '''
+    request_factory = RequestFactory()
+    for path, url in pages:
+        match = resolve(path)
+        # кэш страниц и копия базы для экспорта не нужны
+        view = inspect.unwrap(match.func)
+        request = request_factory.get(url)
+        request.user = AnonymousUser()
+        if asyncio.iscoroutinefunction(view):
+            view = async_to_sync(view)
+        response = view(request, *match.args, **match.kwargs)
+
+        filepath = get_page_filepath(output_dir, path)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wb') as file:
+            file.write(response.content)
+    return len(pages)
+
+
+def split_listing(keys, per_page):
+    '''
+    Split (published_at, id) keys of a listing into pages
+    :return: list of (page number, after cursor, set of post ids)
+    '''
+    pages = []
+    for start in range(0, len(keys), per_page):
+        after = encode_cursor(*keys[start - 1]) if start else None
+        post_ids = {post_id for _, post_id in keys[start:start + per_page]}
+        pages.append((start // per_page + 1, after, post_ids))
+    return pages or [(1, None, set())]
+
+
+def build_listing_urls(url_name, page_number, after, **url_kwargs):
+    if page_number == 1:
+        path = reverse(url_name, kwargs=url_kwargs)
+        return path, path
+
+    path = reverse(url_name, kwargs={**url_kwargs, 'page': page_number})
+    return path, f'{path}?after={after}'
+
+
+def get_archive_listings(archive_month):
+    '''
+    :param archive_month: 'YYYY-MM'
+    :return: year and month listings showing the post
+    '''
+    year, _ = archive_month.split('-')
+    return [f'archive:{year}', f'archive:{archive_month}']
+
+
+def parse_listing(listing):
+    '''
+    :param listing: 'index', 'tag:<title>', 'archive:YYYY' or 'archive:YYYY-MM'
+    :return: (url name, url kwargs)
+    '''
+    if listing == 'index':
+        return 'index', {}
+    kind, value = listing.split(':', 1)
+    if kind == 'tag':
+        return 'tag_filter', {'tag_title': value}
+
+    year, _, month = value.partition('-')
+    url_kwargs = {'year': int(year)}
+    if month:
+        url_kwargs['month'] = int(month)
+    return 'archive', url_kwargs
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(output_dir, manifest):
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w') as file:
+        json.dump(manifest, file)
+
+
+def remove_page(output_dir, path):
+    filepath = get_page_filepath(output_dir, path)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+
+class Command(BaseCommand):
+    help = 'Pre-render every blog page to HTML files for nginx. ' \
+        'Incremental mode skips the popular posts sidebar changes, ' \
+        'so run a full export from time to time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.STATIC_EXPORT_ROOT,
+            help='Directory for rendered pages',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Render only pages of posts changed since the last export',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of rendering processes',
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output']
+        started_at = time.monotonic()
+        exported_at = timezone.now()
+
+        manifest = None
+        if options['incremental']:
+            manifest = load_manifest(output_dir)
+            if manifest is None:
+                self.stdout.write('No previous export found, rendering all')
+
+        pages, removed_paths, new_manifest = self.plan_export(manifest)
+        new_manifest['exported_at'] = exported_at.isoformat()
+
+        os.makedirs(output_dir, exist_ok=True)
+        for path in removed_paths:
+            remove_page(output_dir, path)
+
+        rendered_count = self.render(pages, output_dir, options['workers'])
+        save_manifest(output_dir, new_manifest)
+
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {rendered_count} pages, removed {len(removed_paths)} '
+            f'in {elapsed:.1f} s ({rendered_count / elapsed:.1f} pages/s)'
+        ))
+
+    def plan_export(self, manifest):
+        '''
+        :return: (list of (path, url) to render, paths to remove, manifest)
+        '''
+        posts = list(
+            Post.objects.order_by('-published_at', '-id')
+            .values_list('id', 'slug', 'published_at', 'updated_at')
+        )
+        post_tags = defaultdict(list)
+        tag_links = Post.tags.through.objects\
+            .values_list('post_id', 'tag__title')
+        for post_id, tag_title in tag_links:
+            post_tags[post_id].append(tag_title)
+
+        slugs_tags = {
+            slug: sorted(post_tags[post_id])
+            for post_id, slug, _, _ in posts
+        }
+        slugs_months = {
+            slug: '{}-{:02}'.format(*get_archive_month(published_at))
+            for _, slug, published_at, _ in posts
+        }
+
+        old_slugs_tags = manifest['posts'] if manifest else {}
+        old_slugs_months = manifest.get('archive', {}) if manifest else {}
+        old_page_counts = manifest['pages'] if manifest else {}
+        exported_at = parse_datetime(manifest['exported_at']) \
+            if manifest else None
+
+        changed_ids = set()
+        # списки, у которых поменялся состав постов и сдвинулись страницы
+        moved_listings = set()
+        for post_id, slug, _, updated_at in posts:
+            is_new = slug not in old_slugs_tags
+            if is_new or updated_at > exported_at:
+                changed_ids.add(post_id)
+            old_tags = set(old_slugs_tags.get(slug, []))
+            new_tags = set(slugs_tags[slug])
+            moved_listings.update(
+                f'tag:{tag_title}' for tag_title in old_tags ^ new_tags)
+            if is_new:
+                moved_listings.add('index')
+            old_month = old_slugs_months.get(slug)
+            if old_month != slugs_months[slug]:
+                moved_listings.update(get_archive_listings(slugs_months[slug]))
+                if old_month:
+                    moved_listings.update(get_archive_listings(old_month))
+
+        deleted_slugs = set(old_slugs_tags) - set(slugs_tags)
+        for slug in deleted_slugs:
+            moved_listings.add('index')
+            moved_listings.update(
+                f'tag:{tag_title}' for tag_title in old_slugs_tags[slug])
+            if slug in old_slugs_months:
+                moved_listings.update(
+                    get_archive_listings(old_slugs_months[slug]))
+
+        pages = []
+        for post_id, slug, _, _ in posts:
+            if post_id in changed_ids:
+                path = reverse('post_detail', kwargs={'slug': slug})
+                pages.append((path, path))
+        removed_paths = [
+            reverse('post_detail', kwargs={'slug': slug})
+            for slug in deleted_slugs
+        ]
+
+        listings = {'index': (POSTS_PER_PAGE, [])}
+        for tag_title in Tag.objects.values_list('title', flat=True):
+            listings[f'tag:{tag_title}'] = (TAG_POSTS_PER_PAGE, [])
+        for post_id, slug, published_at, _ in posts:
+            listings['index'][1].append((published_at, post_id))
+            for tag_title in slugs_tags[slug]:
+                listings[f'tag:{tag_title}'][1].append((published_at, post_id))
+            for listing in get_archive_listings(slugs_months[slug]):
+                listings.setdefault(listing, (ARCHIVE_POSTS_PER_PAGE, []))
+                listings[listing][1].append((published_at, post_id))
+
+        page_counts = {}
+        for listing, (per_page, keys) in listings.items():
+            url_name, url_kwargs = parse_listing(listing)
+            listing_pages = split_listing(keys, per_page)
+            page_counts[listing] = len(listing_pages)
+            render_all = manifest is None \
+                or listing in moved_listings \
+                or listing not in old_page_counts
+            for page_number, after, post_ids in listing_pages:
+                if render_all or post_ids & changed_ids:
+                    pages.append(build_listing_urls(
+                        url_name, page_number, after, **url_kwargs))
+
+            for page_number in range(
+                    len(listing_pages) + 1,
+                    old_page_counts.get(listing, 0) + 1):
+                removed_paths.append(build_listing_urls(
+                    url_name, page_number, None, **url_kwargs)[0])
+
+        for listing in set(old_page_counts) - set(page_counts):
+            url_name, url_kwargs = parse_listing(listing)
+            for page_number in range(1, old_page_counts[listing] + 1):
+                removed_paths.append(build_listing_urls(
+                    url_name, page_number, None, **url_kwargs)[0])
+
+        if manifest is None:
+            pages.append((reverse('contacts'), reverse('contacts')))
+
+        new_manifest = {
+            'posts': slugs_tags,
+            'archive': slugs_months,
+            'pages': page_counts,
+        }
+        return pages, removed_paths, new_manifest
+
+    def render(self, pages, output_dir, workers):
+        if workers <= 1:
+            return render_pages(pages, output_dir)
+
+        tasks = [
+            pages[start:start + PAGES_PER_TASK]
+            for start in range(0, len(pages), PAGES_PER_TASK)
+        ]
+        # соединения с базой нельзя делить между процессами
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            rendered_counts = pool.map(
+                render_pages, tasks, [output_dir] * len(tasks))
+            return sum(rendered_counts)
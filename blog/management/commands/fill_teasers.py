@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import POST_TEASER_LENGTH, Post
+
+
+class Command(BaseCommand):
+    help = 'Fill Post.teaser of posts saved without signals, ' \
+        'e.g. by bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        batch_size = options['batch_size']
+        checked_count = 0
+        filled_count = 0
+        last_id = 0
+        while True:
+            # по id, а не OFFSET: каждая пачка начинается с индекса
+            rows = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'text', 'teaser')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            checked_count += len(rows)
+
+            posts = [
+                Post(id=post_id, teaser=text[:POST_TEASER_LENGTH])
+                for post_id, text, teaser in rows
+                if teaser != text[:POST_TEASER_LENGTH]
+            ]
+            with transaction.atomic():
+                Post.objects.bulk_update(posts, ['teaser'])
+            filled_count += len(posts)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Filled {filled_count} of {checked_count} teasers '
+            f'in {time.monotonic() - started_at:.1f} s'
+        ))
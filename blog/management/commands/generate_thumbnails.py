@@ -0,0 +1,108 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blog.models import Post
+from blog.page_cache import collect_post_page_groups, invalidate_page_groups
+from blog.sidebar import invalidate_sidebar
+from blog.thumbnails import compute_image_hash, generate_thumbnails
+
+
+IMAGES_PER_TASK = 20
+
+
+def process_images(images, force=False):
+    '''
+    Hash images and render their thumbnails
+    :param images: list of (post id, image name, stored hash)
+    :return: list of (post id, hash or None if unreadable, written count)
+    '''
+    storage = Post.image.field.storage
+    results = []
+    for post_id, image_name, image_hash in images:
+        try:
+            with storage.open(image_name, 'rb') as file:
+                if force or not image_hash:
+                    image_hash = compute_image_hash(file)
+                written_count = generate_thumbnails(
+                    file, image_hash, force=force)
+        except OSError:
+            results.append((post_id, None, 0))
+            continue
+        results.append((post_id, image_hash, written_count))
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails for images of existing posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of image processing processes',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rehash images and overwrite existing thumbnails',
+        )
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        images = list(
+            Post.objects.exclude(image='')
+            .order_by('id')
+            .values_list('id', 'image', 'image_hash')
+        )
+        results = self.process(images, options['workers'], options['force'])
+
+        stored_hashes = {
+            post_id: image_hash for post_id, _, image_hash in images
+        }
+        changed_posts = []
+        failed_count = 0
+        written_count = 0
+        for post_id, image_hash, post_written_count in results:
+            written_count += post_written_count
+            if image_hash is None:
+                failed_count += 1
+            elif image_hash != stored_hashes[post_id]:
+                changed_posts.append(Post(id=post_id, image_hash=image_hash))
+
+        # bulk_update не трогает updated_at и не вызывает сигналы
+        Post.objects.bulk_update(
+            changed_posts, ['image_hash'], batch_size=500)
+        if changed_posts:
+            invalidate_sidebar()
+            invalidate_page_groups(collect_post_page_groups(
+                [post.id for post in changed_posts]))
+
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(images)} images in {elapsed:.1f} s: '
+            f'{written_count} thumbnails written, '
+            f'{len(changed_posts)} hashes updated'
+        ))
+        if failed_count:
+            self.stderr.write(f'{failed_count} images could not be read')
+
+    def process(self, images, workers, force):
+        if workers <= 1:
+            return process_images(images, force)
+
+        tasks = [
+            images[start:start + IMAGES_PER_TASK]
+            for start in range(0, len(images), IMAGES_PER_TASK)
+        ]
+        # соединения с базой нельзя делить между процессами
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            task_results = pool.map(
+                process_images, tasks, [force] * len(tasks))
+            return [result for results in task_results for result in results]
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.models import Post
+from blog.search import is_search_available, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite FTS5 index of posts from scratch'
+
+    def handle(self, *args, **options):
+        if not is_search_available():
+            raise CommandError('Full-text search needs the SQLite database')
+
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {Post.objects.count()} posts'))
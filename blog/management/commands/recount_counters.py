@@ -0,0 +1,47 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.archive import get_archive_month
+from blog.models import ArchiveMonth, Comment, Post, Tag, count_subquery
+
+
+def recount_counters():
+    with transaction.atomic():
+        Post.objects.update(
+            likes_count=count_subquery(
+                Post.likes.through.objects.all(), 'post_id'),
+            comments_count=count_subquery(
+                Comment.objects.all(), 'post_id'),
+        )
+        Tag.objects.update(
+            posts_count=count_subquery(
+                Post.tags.through.objects.all(), 'tag_id'),
+        )
+        recount_archive_months()
+
+
+def recount_archive_months():
+    posts_counts = Counter()
+    published_ats = Post.objects.values_list('published_at', flat=True)
+    for published_at in published_ats.iterator():
+        posts_counts[get_archive_month(published_at)] += 1
+
+    ArchiveMonth.objects.all().delete()
+    ArchiveMonth.objects.bulk_create([
+        ArchiveMonth(year=year, month=month, posts_count=posts_count)
+        for (year, month), posts_count in posts_counts.items()
+    ])
+
+
+class Command(BaseCommand):
+    help = 'Rebuild likes_count, comments_count and posts_count columns ' \
+        'and the archive months'
+
+    def handle(self, *args, **options):
+        recount_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted {Post.objects.count()} posts '
+            f'and {Tag.objects.count()} tags'
+        ))
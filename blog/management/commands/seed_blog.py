@@ -0,0 +1,191 @@
+import random
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from blog.management.commands.recount_counters import recount_counters
+from blog.models import POST_TEASER_LENGTH, Comment, Post, PostLike, Tag
+from blog.page_cache import invalidate_page_groups
+from blog.search import is_search_available, rebuild_search_index
+from blog.sidebar import invalidate_sidebar
+from blog.trending import compute_trending
+
+
+SQLITE_BULK_PRAGMAS = [
+    'PRAGMA synchronous = OFF',
+    'PRAGMA journal_mode = MEMORY',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',
+]
+SEED_PERIOD = timedelta(days=3 * 365)
+
+
+def batched(objects, batch_size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def random_moment(since=None):
+    now = timezone.now()
+    since = since or now - SEED_PERIOD
+    return since + (now - since) * random.random()
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with synthetic users, posts, tags, ' \
+        'comments and likes for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--likes', type=int, default=200000)
+        parser.add_argument(
+            '--tags-per-post',
+            type=int,
+            default=3,
+            help='Maximum number of tags on a post',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, help='Random seed')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.batch_size = options['batch_size']
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                for pragma in SQLITE_BULK_PRAGMAS:
+                    cursor.execute(pragma)
+
+        user_ids, author_ids = self.step(
+            'users', self.create_users, options['users'])
+        tag_ids = self.step('tags', self.create_tags, options['tags'])
+        posts = self.step(
+            'posts', self.create_posts, options['posts'], author_ids)
+        self.step(
+            'tag links', self.create_tag_links, posts, tag_ids,
+            options['tags_per_post'])
+        self.step(
+            'comments', self.create_comments, options['comments'],
+            posts, user_ids)
+        self.step('likes', self.create_likes, options['likes'],
+                  posts, user_ids)
+        self.step('counters', recount_counters)
+        self.step('trending', compute_trending)
+        # bulk_create не отправляет сигналы, поэтому индекс поиска пуст
+        if is_search_available():
+            self.step('search index', rebuild_search_index)
+
+        invalidate_sidebar()
+        invalidate_page_groups(['index'])
+
+    def step(self, name, create, *args):
+        started_at = time.monotonic()
+        result = create(*args)
+        self.stdout.write(
+            f'{name}: {time.monotonic() - started_at:.1f} s')
+        return result
+
+    def bulk_create(self, model, objects, **kwargs):
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, batch_size=self.batch_size, **kwargs)
+
+    def create_users(self, count):
+        run_id = User.objects.count()
+        # автором поста может быть только сотрудник
+        self.bulk_create(User, (
+            User(
+                username=f'seed-user-{run_id}-{number}',
+                is_staff=number % 100 == 0,
+            )
+            for number in range(count)
+        ))
+        users = User.objects\
+            .filter(username__startswith=f'seed-user-{run_id}-')\
+            .values_list('id', 'is_staff')
+        user_ids = []
+        author_ids = []
+        for user_id, is_staff in users:
+            user_ids.append(user_id)
+            if is_staff:
+                author_ids.append(user_id)
+        return user_ids, author_ids
+
+    def create_tags(self, count):
+        run_id = Tag.objects.count()
+        self.bulk_create(Tag, (
+            Tag(title=f'seed{run_id}-{number}') for number in range(count)
+        ))
+        return list(
+            Tag.objects.filter(title__startswith=f'seed{run_id}-')
+            .values_list('id', flat=True)
+        )
+
+    def create_posts(self, count, author_ids):
+        run_id = Post.objects.count()
+        text = ' '.join(['Lorem ipsum dolor sit amet.'] * 40)
+        # bulk_create не отправляет pre_save, анонс заполняем сами
+        self.bulk_create(Post, (
+            Post(
+                title=f'Seed post {number}',
+                text=text,
+                teaser=text[:POST_TEASER_LENGTH],
+                slug=f'seed-post-{run_id}-{number}',
+                image='',
+                published_at=random_moment(),
+                author_id=random.choice(author_ids),
+            )
+            for number in range(count)
+        ))
+        return list(
+            Post.objects.filter(slug__startswith=f'seed-post-{run_id}-')
+            .values_list('id', 'published_at')
+        )
+
+    def create_tag_links(self, posts, tag_ids, tags_per_post):
+        if not tag_ids:
+            return
+        PostTag = Post.tags.through
+        self.bulk_create(PostTag, (
+            PostTag(post_id=post_id, tag_id=tag_id)
+            for post_id, _ in posts
+            for tag_id in random.sample(
+                tag_ids, random.randint(1, min(tags_per_post, len(tag_ids))))
+        ))
+
+    def create_comments(self, count, posts, user_ids):
+        def generate_comments():
+            for number in range(count):
+                post_id, published_at = random.choice(posts)
+                yield Comment(
+                    post_id=post_id,
+                    author_id=random.choice(user_ids),
+                    text=f'Seed comment {number}',
+                    published_at=random_moment(since=published_at),
+                )
+        self.bulk_create(Comment, generate_comments())
+
+    def create_likes(self, count, posts, user_ids):
+        def generate_likes():
+            for _ in range(count):
+                post_id, published_at = random.choice(posts)
+                yield PostLike(
+                    post_id=post_id,
+                    user_id=random.choice(user_ids),
+                    liked_at=random_moment(since=published_at),
+                )
+        # повторные пары отбрасывает уникальный индекс
+        self.bulk_create(PostLike, generate_likes(), ignore_conflicts=True)
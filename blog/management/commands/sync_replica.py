@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from blog.database import REPLICA_DATABASE
+from blog.sidebar import invalidate_sidebar
+
+
+class Command(BaseCommand):
+    help = 'Copy the main database into the read replica'
+
+    def handle(self, *args, **options):
+        replica_settings = settings.DATABASES.get(REPLICA_DATABASE)
+        if replica_settings is None:
+            raise CommandError(
+                'Копия базы не настроена, задайте DATABASE_REPLICA_FILEPATH')
+
+        started_at = time.monotonic()
+        source = connections['default']
+        source.ensure_connection()
+        # backup копирует согласованный снимок и не мешает писателям в WAL,
+        # читатели копии ждут окончания копирования не дольше busy timeout
+        target = sqlite3.connect(
+            replica_settings['NAME'],
+            timeout=replica_settings['OPTIONS']['timeout'],
+        )
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+
+        # сайдбар мог быть собран из старой копии
+        invalidate_sidebar()
+
+        size_mb = os.path.getsize(replica_settings['NAME']) / 1024 / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Replica synced in {time.monotonic() - started_at:.1f} s, '
+            f'{size_mb:.1f} MB'))
@@ -0,0 +1,95 @@
+import contextvars
+from collections import Counter
+from time import perf_counter
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries_count = 0
+        self.db_time = 0
+        self.template_time = 0
+        self.view_time = 0
+        self.sql_counts = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        '''
+        Wrapper for connection.execute_wrapper
+        '''
+        started_at = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started_at
+            self.queries_count += 1
+            self.sql_counts[sql] += 1
+
+    def find_repeated_queries(self, threshold):
+        '''
+        Same SQL executed at least threshold times, usually N+1
+        :return: dict {sql: times}
+        '''
+        return {
+            sql: count for sql, count in self.sql_counts.items()
+            if count >= threshold
+        }
+
+    def format_server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.queries_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+        ])
+
+
+def record_current_query(execute, sql, params, many, context):
+    '''
+    Count the query in the metrics of the current request, if sampled
+    '''
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_metrics_wrapper(sender, connection, **kwargs):
+    # соединения живут в своих потоках: под ASGI синхронные вьюхи идут
+    # через sync_to_async, а запросы — через run_in_thread, и обёртка
+    # на соединениях одного потока остальных не видит. Поэтому обёртка
+    # стоит на каждом соединении, а метрики она берёт из контекста
+    if record_current_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_current_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+
+        started_at = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += perf_counter() - started_at
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    '''
+    Django templates backend that adds render time to the request metrics
+    '''
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+import random
+from time import perf_counter
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+
+from blog.metrics import RequestMetrics, current_metrics
+
+
+logger = logging.getLogger(__name__)
+
+REPEATED_QUERY_THRESHOLD = 3
+
+
+class RequestMetricsMiddleware:
+    '''
+    Count SQL queries, DB, template and view time for a sample of requests.
+    Results go to the Server-Timing header and the blog.middleware log.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # так Django отличает асинхронный middleware, см. MiddlewareMixin
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started_at = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        metrics.view_time = perf_counter() - started_at
+        return self.add_metrics(request, response, metrics)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        # запросы к базе идут в потоках sync_to_async и run_in_thread,
+        # они находят метрики через current_metrics
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started_at = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        metrics.view_time = perf_counter() - started_at
+        return self.add_metrics(request, response, metrics)
+
+    def add_metrics(self, request, response, metrics):
+        response['Server-Timing'] = metrics.format_server_timing()
+        self.log_metrics(request, response, metrics)
+        return response
+
+    def log_metrics(self, request, response, metrics):
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries_count,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'view_ms': round(metrics.view_time * 1000, 1),
+        }))
+
+        repeated_queries = metrics.find_repeated_queries(
+            REPEATED_QUERY_THRESHOLD)
+        for sql, count in repeated_queries.items():
+            logger.warning(json.dumps({
+                'path': request.path,
+                'repeated_query': sql,
+                'times': count,
+            }))
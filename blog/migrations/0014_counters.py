@@ -0,0 +1,54 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:56
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, column):
+    counts = queryset.filter(**{column: OuterRef('pk')})\
+        .order_by()\
+        .values(column)\
+        .annotate(count=Count('pk'))\
+        .values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Tag = apps.get_model('blog', 'Tag')
+    Comment = apps.get_model('blog', 'Comment')
+
+    Post.objects.update(
+        likes_count=count_subquery(Post.likes.through.objects.all(), 'post_id'),
+        comments_count=count_subquery(Comment.objects.all(), 'post_id'),
+    )
+    Tag.objects.update(
+        posts_count=count_subquery(Post.tags.through.objects.all(), 'tag_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_related_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Количество лайков'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='posts_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['published_at', 'id'], name='post_published_at_id_idx'),
+        ),
+    ]
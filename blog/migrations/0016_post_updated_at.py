@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-18 05:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_post_published_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата и время изменения'),
+            preserve_default=False,
+        ),
+    ]
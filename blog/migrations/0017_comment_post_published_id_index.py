@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'published_at', 'id'], name='comment_post_published_id_idx'),
+        ),
+    ]
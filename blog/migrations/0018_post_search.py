@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('''
+        CREATE VIRTUAL TABLE blog_post_search USING fts5(
+            title, text, tags,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    schema_editor.execute('''
+        INSERT INTO blog_post_search (rowid, title, text, tags)
+        SELECT post.id, post.title, post.text,
+               COALESCE(GROUP_CONCAT(tag.title, ' '), '')
+        FROM blog_post AS post
+        LEFT JOIN blog_post_tags AS post_tag ON post_tag.post_id = post.id
+        LEFT JOIN blog_tag AS tag ON tag.id = post_tag.tag_id
+        GROUP BY post.id
+    ''')
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE blog_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_comment_post_published_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
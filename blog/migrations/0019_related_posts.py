@@ -0,0 +1,41 @@
+# Generated by Django 3.1.14 on 2026-10-18 05:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='related_computed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Когда посчитаны похожие посты'),
+        ),
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='blog.post', verbose_name='Пост')),
+                ('related_post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.post', verbose_name='Похожий пост')),
+            ],
+            options={
+                'verbose_name': 'похожий пост',
+                'verbose_name_plural': 'похожие посты',
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='relatedpost',
+            index=models.Index(fields=['post', '-score'], name='related_post_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='relatedpost',
+            constraint=models.UniqueConstraint(fields=('post', 'related_post'), name='unique_related_post'),
+        ),
+    ]
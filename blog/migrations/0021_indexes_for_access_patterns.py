@@ -0,0 +1,64 @@
+# Generated by Django 3.1.14 on 2026-10-18 05:36
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+SLUG_MAX_LENGTH = 200
+
+
+def make_slugs_unique(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    duplicated_slugs = Post.objects.order_by()\
+        .values('slug')\
+        .annotate(count=Count('id'))\
+        .filter(count__gt=1)\
+        .values_list('slug', flat=True)
+
+    renamed_posts = []
+    for slug in duplicated_slugs:
+        # самый старый пост сохраняет адрес, остальным дописываем id
+        posts = Post.objects.filter(slug=slug).order_by('id')[1:]
+        for post in posts:
+            suffix = f'-{post.id}'
+            post.slug = slug[:SLUG_MAX_LENGTH - len(suffix)] + suffix
+            renamed_posts.append(post)
+    Post.objects.bulk_update(renamed_posts, ['slug'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_post_image_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_slugs_unique, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='post',
+            name='slug',
+            field=models.SlugField(max_length=200, unique=True, verbose_name='Название в виде url'),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-posts_count', 'title'], name='tag_popular_covering_idx'),
+        ),
+        # у автоматических M2M-таблиц нет Meta, поэтому индексы создаём SQL.
+        # Страница тега идёт от тега к постам, связка целиком в индексе
+        migrations.RunSQL(
+            'CREATE INDEX post_tags_tag_post_idx '
+            'ON blog_post_tags (tag_id, post_id)',
+            'DROP INDEX post_tags_tag_post_idx',
+        ),
+        # похожие посты читают все лайки по порядку пользователей
+        migrations.RunSQL(
+            'CREATE INDEX post_likes_user_post_idx '
+            'ON blog_post_likes (user_id, post_id)',
+            'DROP INDEX post_likes_user_post_idx',
+        ),
+    ]
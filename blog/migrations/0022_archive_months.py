@@ -0,0 +1,51 @@
+# Generated by Django 3.1.14 on 2026-10-18 05:37
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_archive_months(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    ArchiveMonth = apps.get_model('blog', 'ArchiveMonth')
+
+    posts_counts = Counter()
+    published_ats = Post.objects.values_list('published_at', flat=True)
+    for published_at in published_ats.iterator():
+        published_at = timezone.localtime(published_at)
+        posts_counts[(published_at.year, published_at.month)] += 1
+
+    ArchiveMonth.objects.bulk_create([
+        ArchiveMonth(year=year, month=month, posts_count=posts_count)
+        for (year, month), posts_count in posts_counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0021_indexes_for_access_patterns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Год')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Месяц')),
+                ('posts_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'месяц архива',
+                'verbose_name_plural': 'месяцы архива',
+                'ordering': ['-year', '-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='archivemonth',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='unique_archive_month'),
+        ),
+        migrations.RunPython(fill_archive_months, migrations.RunPython.noop),
+    ]
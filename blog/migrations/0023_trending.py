@@ -0,0 +1,92 @@
+# Generated by Django 3.1.14 on 2026-10-18 05:43
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# копия blog.trending.TRENDING_EPOCH на момент миграции
+TRENDING_EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def date_existing_likes(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostLike = apps.get_model('blog', 'PostLike')
+    # время старых лайков неизвестно, считаем их ровесниками поста
+    PostLike.objects.update(liked_at=Subquery(
+        Post.objects.filter(id=OuterRef('post_id')).values('published_at')))
+
+
+def score_posts_by_date(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    # до первого запуска compute_trending сайдбар показывает свежие посты,
+    # trending_computed_at остаётся пустым, чтобы запуск пересчитал всё
+    posts = []
+    for post_id, published_at in Post.objects.values_list(
+            'id', 'published_at').iterator():
+        hours = (published_at - TRENDING_EPOCH).total_seconds() / 3600
+        posts.append(Post(id=post_id, trending_score=hours))
+    Post.objects.bulk_update(posts, ['trending_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0022_archive_months'),
+    ]
+
+    operations = [
+        # таблица blog_post_likes уже есть, меняется только описание модели
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PostLike',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.post', verbose_name='Пост')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кто лайкнул')),
+                    ],
+                    options={
+                        'verbose_name': 'лайк',
+                        'verbose_name_plural': 'лайки',
+                        'db_table': 'blog_post_likes',
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='likes',
+                    field=models.ManyToManyField(blank=True, related_name='liked_posts', through='blog.PostLike', to=settings.AUTH_USER_MODEL, verbose_name='Кто лайкнул'),
+                ),
+                migrations.AddIndex(
+                    model_name='postlike',
+                    index=models.Index(fields=['user', 'post'], name='post_likes_user_post_idx'),
+                ),
+                migrations.AlterUniqueTogether(
+                    name='postlike',
+                    unique_together={('post', 'user')},
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='postlike',
+            name='liked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Когда лайкнули'),
+        ),
+        migrations.RunPython(date_existing_likes, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='post',
+            name='trending_computed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Когда посчитан рейтинг популярности'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='Рейтинг популярности'),
+        ),
+        migrations.RunPython(score_posts_by_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0023_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='teaser',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Начало текста'),
+        ),
+        # substr в SQLite режет по символам, как срез строки в сигнале
+        migrations.RunSQL(
+            'UPDATE blog_post SET teaser = substr(text, 1, 200)',
+            migrations.RunSQL.noop,
+        ),
+    ]
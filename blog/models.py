@@ -1,44 +1,91 @@
 from django.db import models
 from django.urls import reverse
-from django.db.models import Count, Prefetch
+from django.db.models import (
+    Count, IntegerField, Max, OuterRef, Prefetch, Subquery,
+)
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from blog.archive import get_archive_bounds
+
+
+POST_TEASER_LENGTH = 200
+
+
+def count_subquery(queryset, column):
+    '''
+    Correlated subquery counting rows of queryset where column = outer pk,
+    used to store counters, e.g. Post.likes_count
+    '''
+    counts = queryset.filter(**{column: OuterRef('pk')})\
+        .order_by()\
+        .values(column)\
+        .annotate(count=Count('pk'))\
+        .values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
 
 
 class PostQuerySet(models.QuerySet):
 
+    def published_in(self, year, month=None):
+        '''
+        Posts of the year or month. A range on published_at
+        uses its index, unlike extracting the year from the column.
+        '''
+        start, end = get_archive_bounds(year, month)
+        return self.filter(published_at__gte=start, published_at__lt=end)
+
     def year(self, year):
-        return self.filter(published_at__year=year).order_by('published_at')
+        return self.published_in(year).order_by('published_at')
 
     def popular(self):
-        return self.annotate(Count('likes', distinct=True)).order_by('-likes__count')
+        return self.order_by('-likes_count')
+
+    def trending(self):
+        '''
+        trending_score is computed by the compute_trending command
+        '''
+        return self.order_by('-trending_score')
+
+    def fetch_last_published_at(self):
+        return self.order_by('-published_at')\
+            .values_list('published_at', flat=True)\
+            .first()
+
+    def fetch_last_updated_at(self):
+        '''
+        Last-Modified of a page with these posts: comments, likes
+        and tags bump updated_at too, see blog.signals
+        '''
+        return self.aggregate(Max('updated_at'))['updated_at__max']
 
     def fetch_likes_count(self):
-        return self.annotate(Count('likes'))
+        '''
+        likes_count is stored on Post and kept in sync by blog.signals
+        :return: QuerySet
+        '''
+        return self
 
     def fetch_with_comments_id_and_count(self):
         '''
-        Dict {post.id: post.comments.count()}
+        Dict {post.id: post.comments.count()} in one grouped query
         :return:
         '''
-        posts = self.annotate(Count('comments'))
-        comments_count = dict([(post.id, post.comments__count) for post in posts])
-        return comments_count
+        posts_ids = [post.id for post in self]
+        comments_count = Comment.objects.filter(post_id__in=posts_ids)\
+            .order_by()\
+            .values('post_id')\
+            .annotate(count=Count('id'))\
+            .values_list('post_id', 'count')
+        return dict(comments_count)
 
-    def fetch_with_comments_count_old(self):
+    def fetch_with_comments_count(self):
         '''
-        list comments.count() for post in posts
-        :return: list of int
+        comments_count is stored on Post and kept in sync by blog.signals
+        :return: QuerySet
         '''
-        comments_count = [post.comments.count() for post in self]
-        return comments_count
-
-    def fetch_with_comments_count(self):
-        posts = self
-        comments_count = [post.comments.count() for post in posts]
-        for i, post in enumerate(posts):
-            post.comments_count = comments_count[i]
-
-        return posts
+        return self
 
     def prefetch_tags(self, to_attr='tags_'):
         return self.prefetch_related(Prefetch(
@@ -50,28 +97,66 @@ class PostQuerySet(models.QuerySet):
 
 class TagQuerySet(models.QuerySet):
     def popular(self):
-        return self.annotate(Count('posts')).order_by('-posts__count')
+        return self.order_by('-posts_count')
 
     def fetch_with_posts_count(self, changed=False):
         """
-        Add comments_count
-        :param changed: if True changed base QuerySet, else 'self' not changed
+        posts_count is stored on Tag and kept in sync by blog.signals
+        :param changed: kept for backward compatibility, not used
         :return: QuerySet
         """
-
-        if changed:
-            return self.annotate(posts_count=Count('posts'))
-
-        model = self
-        return model.annotate(posts_count=Count('posts'))
+        return self
 
 
 class Post(models.Model):
     title = models.CharField('Заголовок', max_length=200)
     text = models.TextField('Текст')
-    slug = models.SlugField('Название в виде url', max_length=200)
+    # списки постов показывают только начало текста и не читают его целиком
+    teaser = models.CharField(
+        'Начало текста',
+        max_length=POST_TEASER_LENGTH,
+        blank=True,
+        editable=False)
+    slug = models.SlugField(
+        'Название в виде url',
+        max_length=200,
+        unique=True)
     image = models.ImageField('Картинка')
+    image_hash = models.CharField(
+        'Хэш картинки',
+        max_length=40,
+        blank=True,
+        db_index=True,
+        editable=False)
     published_at = models.DateTimeField('Дата и время публикации')
+    updated_at = models.DateTimeField(
+        'Дата и время изменения',
+        auto_now=True,
+        db_index=True)
+    likes_count = models.PositiveIntegerField(
+        'Количество лайков',
+        default=0,
+        db_index=True,
+        editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False)
+    related_computed_at = models.DateTimeField(
+        'Когда посчитаны похожие посты',
+        null=True,
+        blank=True,
+        editable=False)
+    trending_score = models.FloatField(
+        'Рейтинг популярности',
+        default=0,
+        db_index=True,
+        editable=False)
+    trending_computed_at = models.DateTimeField(
+        'Когда посчитан рейтинг популярности',
+        null=True,
+        blank=True,
+        editable=False)
 
     author = models.ForeignKey(
         User,
@@ -80,6 +165,7 @@ class Post(models.Model):
         limit_choices_to={'is_staff': True})
     likes = models.ManyToManyField(
         User,
+        through='PostLike',
         related_name='liked_posts',
         verbose_name='Кто лайкнул',
         blank=True)
@@ -92,6 +178,11 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-published_at']
+        indexes = [
+            models.Index(
+                fields=['published_at', 'id'],
+                name='post_published_at_id_idx'),
+        ]
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
 
@@ -99,16 +190,26 @@ class Post(models.Model):
         return self.title
 
     def get_absolute_url(self):
-        return reverse('post_detail', args={'slug': self.slug})
+        return reverse('post_detail', kwargs={'slug': self.slug})
 
 
 class Tag(models.Model):
     title = models.CharField('Тег', max_length=20, unique=True)
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False)
 
     objects = TagQuerySet.as_manager()
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            # покрывает popular(): сайдбар читает теги из индекса
+            models.Index(
+                fields=['-posts_count', 'title'],
+                name='tag_popular_covering_idx'),
+        ]
         verbose_name = 'тег'
         verbose_name_plural = 'теги'
 
@@ -116,7 +217,7 @@ class Tag(models.Model):
         return self.title
 
     def get_absolute_url(self):
-        return reverse('tag_filter', args={'tag_title': self.slug})
+        return reverse('tag_filter', kwargs={'tag_title': self.title})
 
     def clean(self):
         self.title = self.title.lower()
@@ -141,8 +242,109 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['published_at']
+        indexes = [
+            models.Index(
+                fields=['post', 'published_at', 'id'],
+                name='comment_post_published_id_idx'),
+        ]
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
 
     def __str__(self):
         return f'{self.author.username} under {self.post.title}'
+
+
+class PostLike(models.Model):
+    '''
+    Through table of Post.likes, the time of a like ranks trending posts
+    '''
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='+',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Кто лайкнул',
+        related_name='+',
+    )
+    liked_at = models.DateTimeField(
+        'Когда лайкнули',
+        default=timezone.now,
+        editable=False)
+
+    class Meta:
+        # таблица и ограничения остались от автоматической M2M-таблицы
+        db_table = 'blog_post_likes'
+        unique_together = [('post', 'user')]
+        indexes = [
+            models.Index(
+                fields=['user', 'post'],
+                name='post_likes_user_post_idx'),
+        ]
+        verbose_name = 'лайк'
+        verbose_name_plural = 'лайки'
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.post_id}'
+
+
+class RelatedPost(models.Model):
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='related_links',
+    )
+    related_post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        verbose_name='Похожий пост',
+        related_name='+',
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(
+                fields=['post', '-score'],
+                name='related_post_score_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'related_post'],
+                name='unique_related_post'),
+        ]
+        verbose_name = 'похожий пост'
+        verbose_name_plural = 'похожие посты'
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_post_id}'
+
+
+class ArchiveMonth(models.Model):
+    '''
+    Number of posts per month for the archive widget, kept by blog.signals
+    '''
+    year = models.PositiveSmallIntegerField('Год')
+    month = models.PositiveSmallIntegerField('Месяц')
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['year', 'month'],
+                name='unique_archive_month'),
+        ]
+        verbose_name = 'месяц архива'
+        verbose_name_plural = 'месяцы архива'
+
+    def __str__(self):
+        return f'{self.year}-{self.month:02}'
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from blog.archive import get_archive_month
+from blog.concurrency import run_in_thread
+from blog.models import Post, Tag
+from blog.sitemaps import get_sitemap_shard
+
+
+PAGE_CACHE_KEY = 'blog:page:{versions}:{path}'
+PAGE_GROUP_KEY = 'blog:page-group:{group}'
+
+
+def fetch_group_versions(groups):
+    group_keys = [PAGE_GROUP_KEY.format(group=group) for group in groups]
+    versions = cache.get_many(group_keys)
+    return '.'.join(str(versions.get(key, 0)) for key in group_keys)
+
+
+def make_page_key(request, groups):
+    path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_CACHE_KEY.format(
+        versions=fetch_group_versions(groups),
+        path=path_hash,
+    )
+
+
+def build_cached_page(response, last_modified):
+    return {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+        'last_modified': last_modified.timestamp() if last_modified else None,
+    }
+
+
+def build_page_response(request, cached_page):
+    last_modified = cached_page['last_modified']
+    response = get_conditional_response(
+        request,
+        etag=cached_page['etag'],
+        last_modified=int(last_modified) if last_modified else None,
+    )
+    if response is None:
+        response = HttpResponse(
+            cached_page['content'],
+            content_type=cached_page['content_type'],
+        )
+
+    response['ETag'] = cached_page['etag']
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def find_cached_page(request, get_groups, view_kwargs):
+    '''
+    :return: (cache key or None if the request is not cacheable,
+              response or None if the page has to be rendered)
+    '''
+    is_cacheable = request.method in ('GET', 'HEAD') \
+        and not request.user.is_authenticated
+    if not is_cacheable:
+        return None, None
+
+    page_key = make_page_key(request, get_groups(**view_kwargs))
+    cached_page = cache.get(page_key)
+    if cached_page is None:
+        return page_key, None
+    return page_key, build_page_response(request, cached_page)
+
+
+def cache_rendered_page(request, response, page_key, get_last_modified,
+                        view_kwargs):
+    if response.status_code != 200 or response.cookies:
+        return response
+    cached_page = build_cached_page(
+        response, get_last_modified(**view_kwargs))
+    cache.set(page_key, cached_page, settings.PAGE_CACHE_TTL)
+    return build_page_response(request, cached_page)
+
+
+def cache_page_for_anonymous(get_groups, get_last_modified):
+    '''
+    Cache rendered pages for anonymous GET requests.
+    Works for both sync and async views.
+    :param get_groups: callable(**view_kwargs) -> invalidation groups
+        of the page, see invalidate_page_groups
+    :param get_last_modified: callable(**view_kwargs) -> datetime or None,
+        called only when the page is rendered
+    '''
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # сессия и кэш синхронные, поэтому уходим в поток
+                page_key, response = await run_in_thread(
+                    find_cached_page, request, get_groups, kwargs)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                if page_key is None:
+                    return response
+                return await run_in_thread(
+                    cache_rendered_page, request, response, page_key,
+                    get_last_modified, kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page_key, response = find_cached_page(request, get_groups, kwargs)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if page_key is None:
+                return response
+            return cache_rendered_page(
+                request, response, page_key, get_last_modified, kwargs)
+        return wrapper
+    return decorator
+
+
+def collect_post_page_groups(post_ids, tag_ids=()):
+    '''
+    Groups of the pages showing given posts: index, post details,
+    tag and archive pages, the sitemap
+    '''
+    posts = Post.objects.filter(id__in=post_ids)\
+        .values_list('id', 'slug', 'published_at')
+    tags = Tag.objects.filter(
+        Q(id__in=tag_ids) | Q(posts__id__in=post_ids)
+    ).values_list('id', 'title').distinct()
+
+    return {
+        'index',
+        'sitemap',
+        *[f'post:{slug}' for _, slug, _ in posts],
+        *[f'tag:{tag_title}' for _, tag_title in tags],
+        # страницы года и его месяцев сбрасываются вместе
+        *[
+            f'archive:{get_archive_month(published_at)[0]}'
+            for _, _, published_at in posts
+        ],
+        # удалённый пост уже не найти, но его часть совпадает с его id
+        *[f'sitemap:posts-{get_sitemap_shard(pk)}' for pk in post_ids],
+        *[f'sitemap:tags-{get_sitemap_shard(pk)}' for pk, _ in tags],
+    }
+
+
+def invalidate_page_groups(groups):
+    for group in groups:
+        group_key = PAGE_GROUP_KEY.format(group=group)
+        cache.add(group_key, 0, None)
+        try:
+            cache.incr(group_key)
+        except ValueError:
+            cache.set(group_key, 1, None)
@@ -0,0 +1,162 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+from django.urls import reverse
+
+
+# без курсора страница ищется через OFFSET, который перебирает все
+# предыдущие посты; ссылки сайта всегда несут курсор
+MAX_OFFSET_PAGE = 10
+
+
+def encode_raw_cursor(raw_cursor):
+    return base64.urlsafe_b64encode(raw_cursor.encode()).decode().rstrip('=')
+
+
+def decode_raw_cursor(cursor):
+    padded_cursor = cursor + '=' * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(padded_cursor).decode().rsplit('|', 1)
+
+
+def encode_cursor(published_at, pk):
+    return encode_raw_cursor(f'{published_at.isoformat()}|{pk}')
+
+
+def decode_cursor(cursor):
+    try:
+        published_at, pk = decode_raw_cursor(cursor)
+        return datetime.fromisoformat(published_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Http404('Некорректный курсор страницы')
+
+
+def encode_rank_cursor(rank, pk):
+    return encode_raw_cursor(f'{rank!r}|{pk}')
+
+
+def decode_rank_cursor(cursor):
+    try:
+        rank, pk = decode_raw_cursor(cursor)
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Http404('Некорректный курсор страницы')
+
+
+def paginate_posts(posts, per_page, page=1, after=None, before=None):
+    '''
+    Seek pagination over (published_at, id), newest first.
+    Keys are read from the (published_at, id) index, so the cost of a page
+    does not depend on its depth. Without a cursor falls back to OFFSET,
+    allowed up to MAX_OFFSET_PAGE. Pages past the last post raise Http404.
+    :param after: cursor of the last post of the previous page
+    :param before: cursor of the first post of the next page
+    :return: (page posts QuerySet, next cursor, previous cursor)
+    '''
+    if page < 1 or (page > MAX_OFFSET_PAGE and not (after or before)):
+        raise Http404('Нет такой страницы')
+
+    keys = posts.order_by().values_list('published_at', 'id')
+
+    if before:
+        published_at, post_id = decode_cursor(before)
+        keys = keys.filter(
+            Q(published_at__gt=published_at)
+            | Q(published_at=published_at, id__gt=post_id)
+        ).order_by('published_at', 'id')
+        page_keys = list(keys[:per_page + 1])
+        has_previous = len(page_keys) > per_page
+        page_keys = page_keys[:per_page][::-1]
+        has_next = True
+    else:
+        keys = keys.order_by('-published_at', '-id')
+        if after:
+            published_at, post_id = decode_cursor(after)
+            keys = keys.filter(
+                Q(published_at__lt=published_at)
+                | Q(published_at=published_at, id__lt=post_id)
+            )
+            has_previous = True
+        else:
+            offset = per_page * (page - 1)
+            keys = keys[offset:]
+            has_previous = page > 1
+        page_keys = list(keys[:per_page + 1])
+        has_next = len(page_keys) > per_page
+        page_keys = page_keys[:per_page]
+
+    if not page_keys and page > 1:
+        raise Http404('Нет такой страницы')
+
+    page_posts = posts.filter(id__in=[post_id for _, post_id in page_keys])\
+        .order_by('-published_at', '-id')
+
+    next_cursor = None
+    previous_cursor = None
+    if page_keys and has_next:
+        next_cursor = encode_cursor(*page_keys[-1])
+    if page_keys and has_previous:
+        previous_cursor = encode_cursor(*page_keys[0])
+
+    return page_posts, next_cursor, previous_cursor
+
+
+def paginate_comments(comments, per_page, after=None):
+    '''
+    Seek pagination over (published_at, id), oldest first.
+    Rows are read with values(), without building Comment instances.
+    :param after: cursor of the last comment of the previous page
+    :return: (list of comment dicts, next cursor)
+    '''
+    if after:
+        published_at, comment_id = decode_cursor(after)
+        comments = comments.filter(
+            Q(published_at__gt=published_at)
+            | Q(published_at=published_at, id__gt=comment_id)
+        )
+
+    page_comments = comments.order_by('published_at', 'id')\
+        .values('id', 'text', 'published_at', 'author__username')\
+        [:per_page + 1]
+    page_comments = list(page_comments.iterator())
+
+    next_cursor = None
+    if len(page_comments) > per_page:
+        page_comments = page_comments[:per_page]
+        last_comment = page_comments[-1]
+        next_cursor = encode_cursor(
+            last_comment['published_at'], last_comment['id'])
+
+    return page_comments, next_cursor
+
+
+def serialize_pagination(url_name, page, next_cursor, previous_cursor,
+                         **url_kwargs):
+    '''
+    Links for the template pagination block
+    '''
+    first_page_url = reverse(url_name, kwargs=url_kwargs)
+
+    previous_url = None
+    if previous_cursor:
+        previous_url = first_page_url
+        if page > 2:
+            previous_url = '{}?before={}'.format(
+                reverse(url_name, kwargs={**url_kwargs, 'page': page - 1}),
+                previous_cursor,
+            )
+
+    next_url = None
+    if next_cursor:
+        next_url = '{}?after={}'.format(
+            reverse(url_name, kwargs={**url_kwargs, 'page': page + 1}),
+            next_cursor,
+        )
+
+    return {
+        'number': page,
+        'previous_url': previous_url,
+        'next_url': next_url,
+    }
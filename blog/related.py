@@ -0,0 +1,133 @@
+import heapq
+import math
+from array import array
+from collections import defaultdict
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from blog.models import Post, RelatedPost
+
+
+RELATED_POSTS_COUNT = 5
+TAG_WEIGHT = 1.0
+LIKE_WEIGHT = 0.5
+# большие группы почти ничего не говорят о сходстве, а считать их дорого
+MAX_GROUP_SIZE = 300
+MAX_LIKERS_PER_POST = 50
+POSTS_PER_TRANSACTION = 500
+
+
+def build_groups(links):
+    '''
+    Sparse post x group matrix from (group id, post id) rows sorted
+    by group, stored both ways as arrays of ids
+    :return: (dict {group id: array of post ids},
+              dict {post id: array of group ids})
+    '''
+    group_posts = {}
+    post_groups = defaultdict(lambda: array('l'))
+    for group_id, post_id in links:
+        posts = group_posts.setdefault(group_id, array('l'))
+        if len(posts) < MAX_GROUP_SIZE:
+            posts.append(post_id)
+        post_groups[post_id].append(group_id)
+    return group_posts, post_groups
+
+
+def load_matrices():
+    tag_links = Post.tags.through.objects\
+        .order_by('tag_id', '-post_id')\
+        .values_list('tag_id', 'post_id')\
+        .iterator()
+    like_links = Post.likes.through.objects\
+        .order_by('user_id', '-post_id')\
+        .values_list('user_id', 'post_id')\
+        .iterator()
+    return build_groups(tag_links), build_groups(like_links)
+
+
+def add_group_scores(scores, post_id, group_posts, post_groups, weight,
+                     max_groups=None):
+    groups = post_groups.get(post_id, ())
+    if max_groups and len(groups) > max_groups:
+        # самые узкие группы точнее всего описывают пост
+        groups = heapq.nsmallest(
+            max_groups, groups, key=lambda group: len(group_posts[group]))
+
+    for group_id in groups:
+        posts = group_posts[group_id]
+        group_weight = weight / math.log(2 + len(posts))
+        for related_post_id in posts:
+            scores[related_post_id] += group_weight
+
+
+def find_related_posts(post_id, tags, likes):
+    scores = defaultdict(float)
+    add_group_scores(scores, post_id, *tags, TAG_WEIGHT)
+    add_group_scores(
+        scores, post_id, *likes, LIKE_WEIGHT, max_groups=MAX_LIKERS_PER_POST)
+    scores.pop(post_id, None)
+    return heapq.nlargest(
+        RELATED_POSTS_COUNT, scores.items(), key=itemgetter(1))
+
+
+def fetch_outdated_post_ids():
+    '''
+    Posts whose tags or likes changed after the last computation
+    and posts that currently point to them
+    '''
+    outdated_posts = Post.objects.filter(
+        Q(related_computed_at__isnull=True)
+        | Q(updated_at__gt=F('related_computed_at'))
+    )
+    outdated_ids = set(outdated_posts.values_list('id', flat=True))
+    pointing_ids = RelatedPost.objects\
+        .filter(related_post__in=outdated_posts)\
+        .values_list('post_id', flat=True)
+    return outdated_ids | set(pointing_ids)
+
+
+def save_related_posts(post_ids, related_posts, computed_at):
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=post_ids).delete()
+        RelatedPost.objects.bulk_create([
+            RelatedPost(
+                post_id=post_id,
+                related_post_id=related_post_id,
+                score=score,
+            )
+            for post_id in post_ids
+            for related_post_id, score in related_posts[post_id]
+        ])
+        # updated_at не трогаем, иначе пост снова окажется устаревшим
+        Post.objects.filter(id__in=post_ids)\
+            .update(related_computed_at=computed_at)
+
+
+def compute_related_posts(incremental=False):
+    '''
+    Store top related posts by shared tags and co-likes
+    :return: ids of recomputed posts
+    '''
+    # изменения во время расчёта подхватит следующий запуск
+    computed_at = timezone.now()
+    if incremental:
+        post_ids = sorted(fetch_outdated_post_ids())
+    else:
+        post_ids = list(
+            Post.objects.order_by('id').values_list('id', flat=True))
+    if not post_ids:
+        return []
+
+    tags, likes = load_matrices()
+    for start in range(0, len(post_ids), POSTS_PER_TRANSACTION):
+        batch_ids = post_ids[start:start + POSTS_PER_TRANSACTION]
+        related_posts = {
+            post_id: find_related_posts(post_id, tags, likes)
+            for post_id in batch_ids
+        }
+        save_related_posts(batch_ids, related_posts, computed_at)
+    return post_ids
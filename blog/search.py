@@ -0,0 +1,161 @@
+import re
+
+from django.db import connection, connections, router
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from blog.models import Post, Tag
+from blog.pagination import decode_rank_cursor, encode_rank_cursor
+
+
+SEARCH_TABLE = 'blog_post_search'
+# веса колонок title, text, tags для bm25
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+SNIPPET_WORDS = 24
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+IDS_PER_STATEMENT = 500
+
+
+def is_search_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_index_sql(condition):
+    '''
+    INSERT of posts matching the SQL condition with their tag titles
+    '''
+    post_table = Post._meta.db_table
+    post_tags_table = Post.tags.through._meta.db_table
+    tag_table = Tag._meta.db_table
+    return f'''
+        INSERT INTO {SEARCH_TABLE} (rowid, title, text, tags)
+        SELECT post.id, post.title, post.text,
+               COALESCE(GROUP_CONCAT(tag.title, ' '), '')
+        FROM {post_table} AS post
+        LEFT JOIN {post_tags_table} AS post_tag ON post_tag.post_id = post.id
+        LEFT JOIN {tag_table} AS tag ON tag.id = post_tag.tag_id
+        WHERE {condition}
+        GROUP BY post.id
+    '''
+
+
+def update_search_index(post_ids):
+    if not is_search_available():
+        return
+    post_ids = list(post_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(post_ids), IDS_PER_STATEMENT):
+            ids = post_ids[start:start + IDS_PER_STATEMENT]
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                ids,
+            )
+            cursor.execute(
+                build_index_sql(f'post.id IN ({placeholders})'),
+                ids,
+            )
+
+
+def update_tag_search_index(tag_id):
+    '''
+    Reindex all posts with the tag, e.g. after the tag was renamed
+    '''
+    if not is_search_available():
+        return
+    post_tags_table = Post.tags.through._meta.db_table
+    tagged_posts = f'SELECT post_id FROM {post_tags_table} WHERE tag_id = %s'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({tagged_posts})',
+            [tag_id],
+        )
+        cursor.execute(
+            build_index_sql(f'post.id IN ({tagged_posts})'),
+            [tag_id],
+        )
+
+
+def remove_from_search_index(post_ids):
+    if not is_search_available():
+        return
+    post_ids = list(post_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(post_ids), IDS_PER_STATEMENT):
+            ids = post_ids[start:start + IDS_PER_STATEMENT]
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                ids,
+            )
+
+
+def rebuild_search_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(build_index_sql('1 = 1'))
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def build_match_query(query):
+    '''
+    Turn user input into an FTS5 query where every word must match.
+    Words are quoted, so FTS5 operators in the input are searched as text.
+    '''
+    words = re.findall(r'\w+', query)
+    return ' '.join('"{}"'.format(word) for word in words)
+
+
+def format_snippet(raw_snippet):
+    highlighted_snippet = escape(raw_snippet)\
+        .replace(SNIPPET_START, '<mark>')\
+        .replace(SNIPPET_END, '</mark>')
+    return mark_safe(highlighted_snippet)
+
+
+def search_posts(query, per_page, after=None):
+    '''
+    Ranked full-text search over post titles, texts and tags.
+    Seek pagination over (bm25 score, post id), best matches first.
+    :param after: cursor of the last result of the previous page
+    :return: (list of (post id, highlighted snippet), next cursor)
+    '''
+    match_query = build_match_query(query)
+    if not match_query or not is_search_available():
+        return [], None
+
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    sql = f'''
+        SELECT post_id, score, snippet FROM (
+            SELECT rowid AS post_id,
+                   bm25({SEARCH_TABLE}, {weights}) AS score,
+                   snippet({SEARCH_TABLE}, 1, %s, %s, '…', %s) AS snippet
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH %s
+        )
+    '''
+    params = [SNIPPET_START, SNIPPET_END, SNIPPET_WORDS, match_query]
+    if after:
+        score, post_id = decode_rank_cursor(after)
+        sql += ' WHERE score > %s OR (score = %s AND post_id > %s)'
+        params += [score, score, post_id]
+    sql += ' ORDER BY score, post_id LIMIT %s'
+    params.append(per_page + 1)
+
+    # из той же базы, откуда вьюха затем прочитает найденные посты
+    with connections[router.db_for_read(Post)].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_post_id, last_score, _ = rows[-1]
+        next_cursor = encode_rank_cursor(last_score, last_post_id)
+
+    results = [
+        (post_id, format_snippet(snippet)) for post_id, _, snippet in rows
+    ]
+    return results, next_cursor
@@ -0,0 +1,85 @@
+from blog.thumbnails import serialize_image
+
+
+def serialized_comment(comment):
+    return {
+        'text': comment.text,
+        'published_at': comment.published_at,
+        'author': comment.author.username,
+    }
+
+
+def serialize_comment_values(comment):
+    return {
+        'text': comment['text'],
+        'published_at': comment['published_at'],
+        'author': comment['author__username'],
+    }
+
+
+def serialize_post(post):
+    tags = post.tags_
+    return {
+        'title': post.title,
+        'teaser_text': post.teaser,
+        'author': post.author.username,
+        'comments_amount': post.comments_count,
+        **serialize_image(post.image, post.image_hash),
+        'published_at': post.published_at,
+        'slug': post.slug,
+        'tags': [serialize_tag(tag) for tag in tags],
+        'first_tag_title': tags[0].title,
+    }
+
+
+def serialize_related_post(post):
+    return {
+        'title': post.title,
+        'slug': post.slug,
+        **serialize_image(post.image, post.image_hash),
+        'published_at': post.published_at,
+    }
+
+
+def serialize_tag(tag):
+    return {
+        'title': tag.title,
+        'posts_with_tag': tag.posts_count,
+    }
+
+
+# колонки Post, которые нужны для каждого поля, и способ его получить
+POST_FIELDS = {
+    'title': (['title'], lambda post: post.title),
+    'slug': (['slug'], lambda post: post.slug),
+    'text': (['text'], lambda post: post.text),
+    'teaser_text': (['teaser'], lambda post: post.teaser),
+    'author': (['author__username'], lambda post: post.author.username),
+    'comments_amount': (['comments_count'], lambda post: post.comments_count),
+    'likes_amount': (['likes_count'], lambda post: post.likes_count),
+    'image_url': (
+        ['image'],
+        lambda post: post.image.url if post.image else None,
+    ),
+    'image_thumbnail_url': (
+        ['image', 'image_hash'],
+        lambda post: serialize_image(
+            post.image, post.image_hash)['image_thumbnail_url'],
+    ),
+    'image_srcset': (
+        ['image', 'image_hash'],
+        lambda post: serialize_image(
+            post.image, post.image_hash)['image_srcset'],
+    ),
+    'image_webp_srcset': (
+        ['image', 'image_hash'],
+        lambda post: serialize_image(
+            post.image, post.image_hash)['image_webp_srcset'],
+    ),
+    'published_at': (['published_at'], lambda post: post.published_at),
+    'tags': ([], lambda post: [serialize_tag(tag) for tag in post.tags_]),
+}
+
+
+def serialize_post_fields(post, fields):
+    return {field: POST_FIELDS[field][1](post) for field in fields}
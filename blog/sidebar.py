@@ -0,0 +1,180 @@
+import asyncio
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from blog.concurrency import run_in_thread
+from blog.models import ArchiveMonth, Post, Tag
+from blog.serializers import serialize_post, serialize_tag
+
+
+SIDEBAR_CACHE_KEY = 'blog:sidebar'
+SIDEBAR_VERSION_KEY = 'blog:sidebar:version'
+SIDEBAR_LOCK_KEY = 'blog:sidebar:lock'
+SIDEBAR_LOCK_TIMEOUT = 10
+SIDEBAR_LOCK_POLL_INTERVAL = 0.05
+ARCHIVE_MONTHS_COUNT = 12
+
+
+def fetch_popular_posts():
+    most_popular_posts = Post.objects.trending()[:5]\
+        .defer('text')\
+        .prefetch_tags()\
+        .select_related('author')\
+        .fetch_with_comments_count()
+    return [serialize_post(post) for post in most_popular_posts]
+
+
+def fetch_popular_tags():
+    most_popular_tags = Tag.objects.popular()[:5]
+    return [serialize_tag(tag) for tag in most_popular_tags]
+
+
+def fetch_archive_months():
+    # готовые счётчики вместо группировки всех постов по месяцам
+    archive_months = ArchiveMonth.objects.filter(posts_count__gt=0)\
+        [:ARCHIVE_MONTHS_COUNT]
+    return [
+        {
+            'year': archive_month.year,
+            'month': archive_month.month,
+            'date': datetime.date(archive_month.year, archive_month.month, 1),
+            'posts_count': archive_month.posts_count,
+        }
+        for archive_month in archive_months
+    ]
+
+
+def build_sidebar():
+    return {
+        'most_popular_posts': fetch_popular_posts(),
+        'popular_tags': fetch_popular_tags(),
+        'archive_months': fetch_archive_months(),
+    }
+
+
+async def build_sidebar_async():
+    # блоки независимы, поэтому запросы к базе идут параллельно
+    most_popular_posts, popular_tags, archive_months = await asyncio.gather(
+        run_in_thread(fetch_popular_posts),
+        run_in_thread(fetch_popular_tags),
+        run_in_thread(fetch_archive_months),
+    )
+    return {
+        'most_popular_posts': most_popular_posts,
+        'popular_tags': popular_tags,
+        'archive_months': archive_months,
+    }
+
+
+def store_sidebar(sidebar, version):
+    ttl = settings.SIDEBAR_CACHE_TTL
+    cached_sidebar = {
+        'sidebar': sidebar,
+        'version': version,
+        'refresh_at': time.time() + ttl,
+    }
+    # устаревшую копию храним дольше, чтобы отдавать её, пока идёт пересчёт
+    cache.set(SIDEBAR_CACHE_KEY, cached_sidebar, ttl + SIDEBAR_LOCK_TIMEOUT)
+
+
+def find_stored_sidebar(version):
+    cached_sidebar = cache.get(SIDEBAR_CACHE_KEY)
+    if cached_sidebar and cached_sidebar['version'] == version:
+        return cached_sidebar['sidebar']
+    return None
+
+
+def wait_for_sidebar(version):
+    deadline = time.monotonic() + SIDEBAR_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(SIDEBAR_LOCK_POLL_INTERVAL)
+        sidebar = find_stored_sidebar(version)
+        if sidebar is not None:
+            return sidebar
+
+    return build_sidebar()
+
+
+async def wait_for_sidebar_async(version):
+    # ждём в цикле событий: поток пула нужен тому, кто строит сайдбар
+    deadline = time.monotonic() + SIDEBAR_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(SIDEBAR_LOCK_POLL_INTERVAL)
+        sidebar = await run_in_thread(find_stored_sidebar, version)
+        if sidebar is not None:
+            return sidebar
+
+    return await build_sidebar_async()
+
+
+def find_cached_sidebar():
+    '''
+    Sidebar from the cache, fresh or stale if another worker rebuilds it
+    :return: (sidebar or None, cache version, True if the caller took
+              the lock and has to build and store the sidebar)
+    '''
+    cached = cache.get_many([SIDEBAR_CACHE_KEY, SIDEBAR_VERSION_KEY])
+    cached_sidebar = cached.get(SIDEBAR_CACHE_KEY)
+    version = cached.get(SIDEBAR_VERSION_KEY, 0)
+
+    is_fresh = cached_sidebar \
+        and cached_sidebar['version'] == version \
+        and cached_sidebar['refresh_at'] > time.time()
+    if is_fresh:
+        return cached_sidebar['sidebar'], version, False
+
+    if not cache.add(SIDEBAR_LOCK_KEY, True, SIDEBAR_LOCK_TIMEOUT):
+        if cached_sidebar:
+            return cached_sidebar['sidebar'], version, False
+        return None, version, False
+
+    return None, version, True
+
+
+def get_sidebar():
+    '''
+    Serialized "popular posts", "popular tags" and "archive" blocks
+    shared by all pages.
+    Only the worker holding the lock recomputes an expired sidebar,
+    the others keep serving the stale copy meanwhile.
+    :return: dict with most_popular_posts, popular_tags and archive_months
+    '''
+    sidebar, version, has_lock = find_cached_sidebar()
+    if sidebar is not None:
+        return sidebar
+    if not has_lock:
+        return wait_for_sidebar(version)
+
+    try:
+        sidebar = build_sidebar()
+        store_sidebar(sidebar, version)
+    finally:
+        cache.delete(SIDEBAR_LOCK_KEY)
+    return sidebar
+
+
+async def get_sidebar_async():
+    sidebar, version, has_lock = await run_in_thread(find_cached_sidebar)
+    if sidebar is not None:
+        return sidebar
+    if not has_lock:
+        return await wait_for_sidebar_async(version)
+
+    try:
+        sidebar = await build_sidebar_async()
+        await run_in_thread(store_sidebar, sidebar, version)
+    finally:
+        await run_in_thread(cache.delete, SIDEBAR_LOCK_KEY)
+    return sidebar
+
+
+def invalidate_sidebar():
+    cache.add(SIDEBAR_VERSION_KEY, 0, None)
+    try:
+        cache.incr(SIDEBAR_VERSION_KEY)
+    except ValueError:
+        # ключ вытеснен из кэша между add и incr
+        cache.set(SIDEBAR_VERSION_KEY, 1, None)
@@ -0,0 +1,347 @@
+import logging
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from blog.archive import get_archive_month
+from blog.models import (
+    POST_TEASER_LENGTH, ArchiveMonth, Comment, Post, Tag,
+)
+from blog.page_cache import collect_post_page_groups, invalidate_page_groups
+from blog.search import (
+    remove_from_search_index, update_search_index, update_tag_search_index,
+)
+from blog.sidebar import invalidate_sidebar
+from blog.sitemaps import get_sitemap_shard
+from blog.thumbnails import compute_image_hash, ensure_thumbnails
+from blog.trending import score_new_post
+
+
+logger = logging.getLogger(__name__)
+
+
+def change_counter(model, field, deltas):
+    '''
+    Atomically shift the counter column by delta for every pk
+    :param deltas: dict {pk: delta}
+    '''
+    pks_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            pks_by_delta[delta].append(pk)
+
+    for delta, pks in pks_by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def fetch_through_pairs(sender, instance, action, reverse, pk_set):
+    '''
+    Rows of the m2m through table touched by the change
+    :return: list of dicts with both foreign key columns
+    '''
+    source_column, target_column = [
+        field.attname for field in sender._meta.get_fields()
+        if field.is_relation and field.many_to_one
+    ]
+    instance_column, other_column = source_column, target_column
+    if reverse:
+        instance_column, other_column = target_column, source_column
+
+    if action == 'pre_add':
+        return [
+            {instance_column: instance.pk, other_column: pk}
+            for pk in pk_set
+        ]
+
+    rows = sender.objects.filter(**{instance_column: instance.pk})
+    if action == 'pre_remove':
+        rows = rows.filter(**{f'{other_column}__in': pk_set})
+    return list(rows.values(source_column, target_column))
+
+
+def handle_m2m_counter(sender, instance, action, reverse, pk_set,
+                       model, field, column):
+    # pk_set в post_add уже очищен от существующих связей,
+    # а для remove и clear связи надо найти до удаления
+    pending = instance.__dict__.setdefault('_pending_counter_pairs', {})
+
+    if action in ('pre_remove', 'pre_clear'):
+        pending[sender] = fetch_through_pairs(
+            sender, instance, action, reverse, pk_set)
+    elif action == 'post_add':
+        pairs = fetch_through_pairs(
+            sender, instance, 'pre_add', reverse, pk_set)
+        deltas = Counter(pair[column] for pair in pairs)
+        change_counter(model, field, deltas)
+    elif action in ('post_remove', 'post_clear'):
+        pairs = pending.pop(sender, [])
+        deltas = Counter(pair[column] for pair in pairs)
+        change_counter(model, field, {
+            pk: -delta for pk, delta in deltas.items()
+        })
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    handle_m2m_counter(
+        sender, instance, action, reverse, pk_set,
+        model=Post, field='likes_count', column='post_id',
+    )
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_posts_count(sender, instance, action, reverse, pk_set, **kwargs):
+    handle_m2m_counter(
+        sender, instance, action, reverse, pk_set,
+        model=Tag, field='posts_count', column='tag_id',
+    )
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_post(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._previous_post_id = None
+        return
+    instance._previous_post_id = sender.objects.filter(pk=instance.pk)\
+        .values_list('post_id', flat=True).first()
+
+
+@receiver(post_save, sender=Comment)
+def increase_comments_count(sender, instance, created, **kwargs):
+    previous_post_id = getattr(instance, '_previous_post_id', None)
+    if created or previous_post_id is None:
+        change_counter(Post, 'comments_count', {instance.post_id: 1})
+    elif previous_post_id != instance.post_id:
+        change_counter(Post, 'comments_count', {
+            previous_post_id: -1,
+            instance.post_id: 1,
+        })
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_comments_count(sender, instance, **kwargs):
+    change_counter(Post, 'comments_count', {instance.post_id: -1})
+
+
+@receiver(pre_delete, sender=Post)
+def decrease_posts_count(sender, instance, **kwargs):
+    # каскадное удаление не отправляет m2m_changed
+    tag_ids = Post.tags.through.objects.filter(post_id=instance.pk)\
+        .values_list('tag_id', flat=True)
+    change_counter(Tag, 'posts_count', {tag_id: -1 for tag_id in tag_ids})
+
+
+def shift_archive_months(deltas):
+    '''
+    :param deltas: dict {(year, month): delta}
+    '''
+    for (year, month), delta in deltas.items():
+        if not delta:
+            continue
+        ArchiveMonth.objects.get_or_create(year=year, month=month)
+        # посты из bulk_create не учтены, счётчик не должен уйти в минус
+        ArchiveMonth.objects.filter(year=year, month=month)\
+            .update(posts_count=Greatest(F('posts_count') + delta, 0))
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_archive_month(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._previous_published_at = None
+        return
+    instance._previous_published_at = sender.objects.filter(pk=instance.pk)\
+        .values_list('published_at', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def update_archive_months(sender, instance, created, **kwargs):
+    archive_month = get_archive_month(instance.published_at)
+    previous_published_at = getattr(instance, '_previous_published_at', None)
+    if created or previous_published_at is None:
+        shift_archive_months({archive_month: 1})
+        return
+
+    previous_archive_month = get_archive_month(previous_published_at)
+    if previous_archive_month != archive_month:
+        shift_archive_months({previous_archive_month: -1, archive_month: 1})
+        # страницы нового месяца сбросит invalidate_post_pages
+        previous_year, _ = previous_archive_month
+        transaction.on_commit(
+            lambda: invalidate_page_groups([f'archive:{previous_year}']))
+
+
+@receiver(post_delete, sender=Post)
+def decrease_archive_month(sender, instance, **kwargs):
+    shift_archive_months({get_archive_month(instance.published_at): -1})
+
+
+@receiver(pre_delete, sender=User)
+def decrease_likes_count(sender, instance, **kwargs):
+    post_ids = Post.likes.through.objects.filter(user_id=instance.pk)\
+        .values_list('post_id', flat=True)
+    change_counter(Post, 'likes_count', {post_id: -1 for post_id in post_ids})
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_sidebar_cache(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(invalidate_sidebar)
+
+
+def mark_posts_changed(post_ids):
+    # комментарии, лайки и теги меняют страницу поста, но не сохраняют его
+    Post.objects.filter(id__in=post_ids).update(updated_at=timezone.now())
+
+
+def invalidate_pages_on_commit(post_ids, tag_ids=()):
+    groups = collect_post_page_groups(post_ids, tag_ids)
+    transaction.on_commit(lambda: invalidate_page_groups(groups))
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_post_pages_on_m2m(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    # страницы тегов ищем, пока связи с постом ещё существуют
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    pairs = fetch_through_pairs(
+        sender, instance, action.replace('post_', 'pre_'), reverse, pk_set)
+    post_ids = {pair['post_id'] for pair in pairs}
+    mark_posts_changed(post_ids)
+    invalidate_pages_on_commit(
+        post_ids=post_ids,
+        tag_ids={pair['tag_id'] for pair in pairs if 'tag_id' in pair},
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(pre_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    invalidate_pages_on_commit(post_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_sitemap(sender, instance, **kwargs):
+    groups = ['sitemap', f'sitemap:tags-{get_sitemap_shard(instance.pk)}']
+    transaction.on_commit(lambda: invalidate_page_groups(groups))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    mark_posts_changed([instance.post_id])
+    invalidate_pages_on_commit(post_ids=[instance.post_id])
+
+
+@receiver(post_save, sender=Post)
+def index_post_for_search(sender, instance, **kwargs):
+    update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_search(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+def index_tag_posts_for_search(sender, instance, created, **kwargs):
+    if not created:
+        update_tag_search_index(instance.pk)
+
+
+@receiver(pre_delete, sender=Tag)
+def reindex_deleted_tag_posts(sender, instance, **kwargs):
+    # каскадное удаление связей не отправляет m2m_changed,
+    # а после коммита связей уже нет и тег пропадёт из индекса
+    post_ids = list(
+        Post.tags.through.objects.filter(tag_id=instance.pk)
+        .values_list('post_id', flat=True)
+    )
+    transaction.on_commit(lambda: update_search_index(post_ids))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_post_tags_for_search(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    pending = instance.__dict__.setdefault('_pending_search_post_ids', set())
+
+    if action in ('pre_remove', 'pre_clear'):
+        pairs = fetch_through_pairs(sender, instance, action, reverse, pk_set)
+        pending.update(pair['post_id'] for pair in pairs)
+    elif action == 'post_add':
+        pairs = fetch_through_pairs(
+            sender, instance, 'pre_add', reverse, pk_set)
+        update_search_index({pair['post_id'] for pair in pairs})
+    elif action in ('post_remove', 'post_clear'):
+        update_search_index(pending)
+        pending.clear()
+
+
+@receiver(pre_save, sender=Post)
+def fill_post_teaser(sender, instance, **kwargs):
+    instance.teaser = instance.text[:POST_TEASER_LENGTH]
+
+
+@receiver(pre_save, sender=Post)
+def score_post_for_trending(sender, instance, **kwargs):
+    # новый пост попадает в сайдбар до запуска compute_trending
+    if instance._state.adding:
+        instance.trending_score = score_new_post(instance.published_at)
+
+
+@receiver(pre_save, sender=Post)
+def hash_post_image(sender, instance, **kwargs):
+    image = instance.image
+    if not image:
+        instance.image_hash = ''
+        return
+    # свежезагруженный файл ещё не сохранён в хранилище
+    if image._committed and instance.image_hash:
+        return
+
+    try:
+        image.open('rb')
+    except FileNotFoundError:
+        return
+    try:
+        image_hash = compute_image_hash(image.file)
+    finally:
+        if image._committed:
+            image.close()
+    if image_hash != instance.image_hash:
+        instance.image_hash = image_hash
+        instance._thumbnails_outdated = True
+
+
+def generate_post_thumbnails(image_name, image_hash):
+    try:
+        ensure_thumbnails(image_name, image_hash)
+    except OSError:
+        # недостающие превью создаст первый запрос к ним
+        logger.exception('Thumbnails of %s were not generated', image_name)
+
+
+@receiver(post_save, sender=Post)
+def create_post_thumbnails(sender, instance, **kwargs):
+    if not instance.__dict__.pop('_thumbnails_outdated', False):
+        return
+    image_name, image_hash = instance.image.name, instance.image_hash
+    transaction.on_commit(
+        lambda: generate_post_thumbnails(image_name, image_hash))
@@ -0,0 +1,141 @@
+from xml.sax.saxutils import escape
+
+from django.db.models import F, Max
+from django.urls import reverse
+
+from blog.models import ArchiveMonth, Post, Tag
+
+
+# столько адресов протокол разрешает в одном файле
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SITEMAP_SECTIONS = ('pages', 'posts', 'tags')
+
+
+def get_sitemap_shard(pk):
+    '''
+    Shards are ranges of ids, so a post never moves to another shard
+    and a change regenerates only the shard of the changed post
+    '''
+    return (pk - 1) // SITEMAP_SHARD_SIZE
+
+
+def get_shard_bounds(number):
+    return number * SITEMAP_SHARD_SIZE, (number + 1) * SITEMAP_SHARD_SIZE
+
+
+def format_lastmod(moment):
+    return moment.isoformat(timespec='seconds') if moment else None
+
+
+def render_urlset(base_url, urls):
+    '''
+    :param urls: iterable of (path, lastmod datetime or None)
+    :return: generator of XML chunks
+    '''
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<urlset xmlns="{SITEMAP_NAMESPACE}">\n'
+    for path, lastmod in urls:
+        yield f'<url><loc>{escape(base_url + path)}</loc>'
+        if lastmod:
+            yield f'<lastmod>{format_lastmod(lastmod)}</lastmod>'
+        yield '</url>\n'
+    yield '</urlset>\n'
+
+
+def render_sitemap_index(base_url, shards):
+    '''
+    :param shards: iterable of (section, number, lastmod datetime or None)
+    '''
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'
+    for section, number, lastmod in shards:
+        path = reverse(
+            'sitemap_section', kwargs={'section': section, 'number': number})
+        yield f'<sitemap><loc>{escape(base_url + path)}</loc>'
+        if lastmod:
+            yield f'<lastmod>{format_lastmod(lastmod)}</lastmod>'
+        yield '</sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def annotate_shard(queryset):
+    return queryset.order_by()\
+        .annotate(shard=(F('id') - 1) / SITEMAP_SHARD_SIZE)\
+        .values('shard')
+
+
+def fetch_sitemap_shards():
+    '''
+    :return: list of (section, number, lastmod) of non-empty shards
+    '''
+    last_published_at = Post.objects.fetch_last_published_at()
+    shards = [('pages', 0, last_published_at)]
+    post_shards = annotate_shard(Post.objects.all())\
+        .annotate(lastmod=Max('updated_at'))\
+        .values_list('shard', 'lastmod')
+    shards.extend(
+        ('posts', number, lastmod) for number, lastmod in sorted(post_shards)
+    )
+    # страница тега меняется с новыми постами, точнее считать дорого
+    tag_shards = annotate_shard(Tag.objects.all())\
+        .distinct()\
+        .values_list('shard', flat=True)
+    shards.extend(
+        ('tags', number, last_published_at) for number in sorted(tag_shards)
+    )
+    return shards
+
+
+def iterate_pages_urls():
+    yield reverse('index'), Post.objects.fetch_last_published_at()
+    yield reverse('contacts'), None
+    archive_months = ArchiveMonth.objects.filter(posts_count__gt=0)\
+        .values_list('year', 'month')
+    years = []
+    for year, month in archive_months:
+        if year not in years:
+            years.append(year)
+            yield reverse('archive', kwargs={'year': year}), None
+        yield reverse('archive', kwargs={'year': year, 'month': month}), None
+
+
+def iterate_posts_urls(number):
+    start, end = get_shard_bounds(number)
+    # словари вместо моделей, а адрес собираем из готового префикса
+    post_url = reverse('post_detail', kwargs={'slug': 'slug'})[:-len('slug')]
+    posts = Post.objects.filter(id__gt=start, id__lte=end)\
+        .order_by('id')\
+        .values_list('slug', 'updated_at')\
+        .iterator()
+    for slug, updated_at in posts:
+        yield post_url + slug, updated_at
+
+
+def iterate_tags_urls(number):
+    start, end = get_shard_bounds(number)
+    tag_links = Post.tags.through.objects\
+        .filter(tag_id__gt=start, tag_id__lte=end)\
+        .order_by()\
+        .values('tag_id')\
+        .annotate(lastmod=Max('post__published_at'))\
+        .values_list('tag_id', 'lastmod')
+    lastmods = dict(tag_links)
+    tags = Tag.objects.filter(id__gt=start, id__lte=end)\
+        .order_by('id')\
+        .values_list('id', 'title')\
+        .iterator()
+    for tag_id, title in tags:
+        path = reverse('tag_filter', kwargs={'tag_title': title})
+        yield path, lastmods.get(tag_id)
+
+
+def iterate_section_urls(section, number):
+    '''
+    :return: iterator of (path, lastmod) of the shard
+    '''
+    if section == 'pages':
+        return iterate_pages_urls()
+    if section == 'posts':
+        return iterate_posts_urls(number)
+    return iterate_tags_urls(number)
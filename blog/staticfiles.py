@@ -0,0 +1,229 @@
+import gzip
+import os
+import posixpath
+import re
+import tempfile
+
+import brotli
+import rcssmin
+import rjsmin
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.finders import BaseFinder
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from PIL import Image
+
+
+# бандлы и файлы, из которых они собираются, в порядке подключения
+STATIC_BUNDLES = {
+    'css/bundle.css': [
+        'vendors/bootstrap/bootstrap.min.css',
+        'vendors/fontawesome/css/all.min.css',
+        'vendors/themify-icons/themify-icons.css',
+        'vendors/linericon/style.css',
+        'vendors/owl-carousel/owl.theme.default.min.css',
+        'vendors/owl-carousel/owl.carousel.min.css',
+        'css/style.css',
+    ],
+    'js/bundle.js': [
+        'vendors/jquery/jquery-3.2.1.min.js',
+        'vendors/bootstrap/bootstrap.bundle.min.js',
+        'vendors/owl-carousel/owl.carousel.min.js',
+        'js/jquery.ajaxchimp.min.js',
+        'js/mail-script.js',
+        'js/main.js',
+    ],
+}
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.eot', '.ttf', '.json')
+OPTIMIZED_IMAGES_PREFIX = 'img/'
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(['"]?)(.*?)\1\s*\)''')
+CSS_IMPORT_PATTERN = re.compile(r'@import\s[^;]+;')
+
+
+def is_relative_url(url):
+    return not re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', url, re.IGNORECASE)
+
+
+def rebase_css_urls(css, source_name, bundle_name):
+    '''
+    Make relative url() of a source file valid from the bundle location
+    '''
+    source_dir = posixpath.dirname(source_name)
+    bundle_dir = posixpath.dirname(bundle_name)
+
+    def rebase(match):
+        quote, url = match.groups()
+        if not url or not is_relative_url(url):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(source_dir, url))
+        return 'url({0}{1}{0})'.format(
+            quote, posixpath.relpath(target, bundle_dir))
+
+    return CSS_URL_PATTERN.sub(rebase, css)
+
+
+def build_css_bundle(bundle_name, sources):
+    imports = []
+    parts = []
+    for source_name, content in sources:
+        css = rebase_css_urls(content, source_name, bundle_name)
+        # @import допустим только в начале файла
+        imports.extend(CSS_IMPORT_PATTERN.findall(css))
+        parts.append(rcssmin.cssmin(CSS_IMPORT_PATTERN.sub('', css)))
+    return ''.join(imports + parts)
+
+
+def build_js_bundle(bundle_name, sources):
+    return ';\n'.join(
+        rjsmin.jsmin(content).rstrip(';') for _, content in sources
+    ) + ';\n'
+
+
+def write_atomically(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def build_bundle(bundle_name):
+    '''
+    Concatenate and minify sources of the bundle, skipped if it is fresh
+    :return: path of the built bundle
+    '''
+    source_names = STATIC_BUNDLES[bundle_name]
+    source_paths = [finders.find(name) for name in source_names]
+    missing_names = [
+        name for name, path in zip(source_names, source_paths) if not path
+    ]
+    if missing_names:
+        raise FileNotFoundError(
+            f'Sources of {bundle_name} not found: {", ".join(missing_names)}')
+
+    bundle_path = os.path.join(settings.STATIC_BUNDLES_ROOT, bundle_name)
+    if os.path.exists(bundle_path):
+        bundle_modified_at = os.path.getmtime(bundle_path)
+        if all(os.path.getmtime(path) <= bundle_modified_at
+               for path in source_paths):
+            return bundle_path
+
+    sources = []
+    for name, path in zip(source_names, source_paths):
+        with open(path, encoding='utf-8') as file:
+            sources.append((name, file.read()))
+    build = build_css_bundle if bundle_name.endswith('.css') \
+        else build_js_bundle
+    write_atomically(
+        bundle_path, build(bundle_name, sources).encode('utf-8'))
+    return bundle_path
+
+
+class BundleFinder(BaseFinder):
+    '''
+    Serves bundles from STATIC_BUNDLES to runserver and collectstatic
+    '''
+
+    def check(self, **kwargs):
+        return []
+
+    def find(self, path, all=False):
+        if path not in STATIC_BUNDLES:
+            return [] if all else None
+        bundle_path = build_bundle(path)
+        return [bundle_path] if all else bundle_path
+
+    def list(self, ignore_patterns):
+        storage = FileSystemStorage(location=settings.STATIC_BUNDLES_ROOT)
+        for bundle_name in STATIC_BUNDLES:
+            build_bundle(bundle_name)
+            yield bundle_name, storage
+
+
+def optimize_image(path):
+    '''
+    Lossless recompression, the file is replaced only if it gets smaller
+    :return: number of saved bytes
+    '''
+    with Image.open(path) as image:
+        options = {'optimize': True}
+        if image.format == 'JPEG':
+            options.update(quality='keep', progressive=True)
+        elif image.format != 'PNG':
+            return 0
+        for key in ('icc_profile', 'exif', 'transparency', 'dpi'):
+            if key in image.info:
+                options[key] = image.info[key]
+
+        with tempfile.SpooledTemporaryFile() as optimized_file:
+            image.save(optimized_file, image.format, **options)
+            optimized_file.seek(0)
+            optimized_content = optimized_file.read()
+
+    saved_bytes = os.path.getsize(path) - len(optimized_content)
+    if saved_bytes <= 0:
+        return 0
+    write_atomically(path, optimized_content)
+    return saved_bytes
+
+
+def write_compressed_copies(path):
+    '''
+    Gzip and brotli siblings for nginx gzip_static and brotli_static
+    '''
+    with open(path, 'rb') as file:
+        content = file.read()
+    compressed_copies = {
+        '.gz': lambda: gzip.compress(content, compresslevel=9, mtime=0),
+        '.br': lambda: brotli.compress(content, quality=11),
+    }
+    for extension, compress in compressed_copies.items():
+        compressed_path = path + extension
+        if os.path.exists(compressed_path):
+            continue
+        compressed_content = compress()
+        if len(compressed_content) < len(content):
+            write_atomically(compressed_path, compressed_content)
+
+
+class BundledStaticFilesStorage(ManifestStaticFilesStorage):
+    '''
+    Hashed file names plus optimized images and precompressed copies
+    '''
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert_existing(matchobj):
+            try:
+                return converter(matchobj)
+            except (ValueError, SuspiciousFileOperation):
+                # сторонние стили ссылаются и на файлы, которых нет в сборке
+                return matchobj.group(1)
+        return convert_existing
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            # processed значит, что файл с этим хэшем записан впервые;
+            # хэш считается от исходника, так что сжатие его не меняет
+            if processed and hashed_name \
+                    and name.startswith(OPTIMIZED_IMAGES_PREFIX) \
+                    and name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                optimize_image(self.path(hashed_name))
+            yield name, hashed_name, processed
+
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                write_compressed_copies(self.path(hashed_name))
@@ -0,0 +1,793 @@
+import datetime
+import queue
+from contextlib import contextmanager
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.likes import (
+    apply_like_events, collect_events, flush_pending_events, like_events,
+)
+from blog.management.commands.bench_database import (
+    BENCH_COMMENT_TEXT, delete_comments, write_comment,
+)
+from blog.management.commands.recount_counters import recount_counters
+from blog.models import ArchiveMonth, Comment, Post, PostLike, Tag
+from blog.pagination import MAX_OFFSET_PAGE, encode_cursor, paginate_posts
+from blog.search import search_posts
+
+
+# манифест статики собирает build_static, тестам он не нужен
+blog_test_settings = override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',  # noqa: E501
+    REQUEST_METRICS_SAMPLE_RATE=0,
+)
+
+
+def create_post(author, slug, published_at=None, **kwargs):
+    fields = {
+        'title': slug.capitalize(),
+        'text': 'Lorem ipsum dolor sit amet.',
+        'image': 'missing.jpg',
+        'published_at': published_at or timezone.now(),
+        **kwargs,
+    }
+    return Post.objects.create(author=author, slug=slug, **fields)
+
+
+@blog_test_settings
+class ViewQueriesTestCase(TestCase):
+    '''
+    Pages of the blog run a fixed number of queries,
+    however many posts, comments and likes there are
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', is_staff=True)
+        cls.readers = [
+            User.objects.create(username=f'reader{number}')
+            for number in range(20)
+        ]
+        cls.tags = [
+            Tag.objects.create(title=f'tag{number}') for number in range(5)
+        ]
+        cls.posts = [cls.create_post(number) for number in range(12)]
+        cls.post = cls.posts[0]
+
+    @classmethod
+    def create_post(cls, number):
+        post = Post.objects.create(
+            title=f'Post {number}',
+            text='Lorem ipsum dolor sit amet. ' * 20,
+            slug=f'post-{number}',
+            image='missing.jpg',
+            published_at=timezone.now() - datetime.timedelta(days=number),
+            author=cls.author,
+        )
+        post.tags.set(cls.tags)
+        PostLike.objects.bulk_create([
+            PostLike(post=post, user=reader) for reader in cls.readers
+        ])
+        return post
+
+    def setUp(self):
+        # страницы и сайдбар не должны приходить из кэша прошлого теста
+        cache.clear()
+
+    def add_comments(self, post, count):
+        now = timezone.now()
+        Comment.objects.bulk_create([
+            Comment(
+                post=post,
+                author=self.readers[number % len(self.readers)],
+                text=f'Comment {number}',
+                published_at=now - datetime.timedelta(minutes=number),
+            )
+            for number in range(count)
+        ])
+        # bulk_create не отправляет сигналы, поэтому счётчики пересчитываем
+        recount_counters()
+        cache.clear()
+
+    def assert_page_queries(self, url, queries_count):
+        with self.assertNumQueries(queries_count):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_index_queries(self):
+        for post in self.posts:
+            self.add_comments(post, 30)
+        self.assert_page_queries(reverse('index'), 8)
+
+    def test_tag_filter_queries(self):
+        for post in self.posts:
+            self.add_comments(post, 30)
+        url = reverse('tag_filter', kwargs={'tag_title': self.tags[0].title})
+        self.assert_page_queries(url, 9)
+
+    def test_post_detail_queries(self):
+        self.add_comments(self.post, 30)
+        url = reverse('post_detail', kwargs={'slug': self.post.slug})
+        response = self.assert_page_queries(url, 9)
+        self.assertEqual(response.context['post']['comments_amount'], 30)
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        url = reverse('post_detail', kwargs={'slug': self.post.slug})
+        self.add_comments(self.post, 300)
+        response = self.assert_page_queries(url, 9)
+        self.assertEqual(response.context['post']['comments_amount'], 300)
+        self.assertEqual(response.context['post']['likes_amount'], 20)
+        self.assertEqual(len(response.context['post']['tags']), 5)
+
+        self.add_comments(self.post, 300)
+        response = self.assert_page_queries(url, 9)
+        self.assertEqual(response.context['post']['comments_amount'], 600)
+
+
+@blog_test_settings
+class PaginatePostsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author')
+        tag = Tag.objects.create(title='tag')
+        now = timezone.now()
+        cls.posts = [
+            create_post(
+                author, f'post-{number}',
+                published_at=now - datetime.timedelta(days=number))
+            for number in range(MAX_OFFSET_PAGE + 2)
+        ]
+        tag.posts.set(cls.posts)
+
+    def paginate(self, **kwargs):
+        page_posts, _, _ = paginate_posts(Post.objects.all(), 1, **kwargs)
+        return list(page_posts)
+
+    def test_offset_page(self):
+        self.assertEqual(self.paginate(page=2), [self.posts[1]])
+        self.assertEqual(
+            self.paginate(page=MAX_OFFSET_PAGE),
+            [self.posts[MAX_OFFSET_PAGE - 1]])
+
+    def test_deep_page_needs_cursor(self):
+        with self.assertRaises(Http404):
+            self.paginate(page=MAX_OFFSET_PAGE + 1)
+
+        post = self.posts[MAX_OFFSET_PAGE - 1]
+        after = encode_cursor(post.published_at, post.pk)
+        self.assertEqual(
+            self.paginate(page=MAX_OFFSET_PAGE + 1, after=after),
+            [self.posts[MAX_OFFSET_PAGE]])
+
+    def test_page_past_last_post(self):
+        post = self.posts[-1]
+        after = encode_cursor(post.published_at, post.pk)
+        with self.assertRaises(Http404):
+            self.paginate(page=len(self.posts) + 1, after=after)
+        # API листает без номеров страниц и получает пустой список
+        self.assertEqual(self.paginate(after=after), [])
+
+    def test_index_pages(self):
+        # на главной по 5 постов, третья страница последняя
+        response = self.client.get(reverse('index', kwargs={'page': 3}))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('index', kwargs={'page': 4}))
+        self.assertEqual(response.status_code, 404)
+
+
+@blog_test_settings
+class LastModifiedTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', is_staff=True)
+        tag = Tag.objects.create(title='tag')
+        published_at = timezone.now() - datetime.timedelta(days=1)
+        cls.post = Post.objects.create(
+            title='Post',
+            text='Lorem ipsum',
+            slug='post',
+            image='missing.jpg',
+            published_at=published_at,
+            author=cls.author,
+        )
+        cls.post.tags.set([tag])
+        Post.objects.update(updated_at=published_at)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comment_changes_last_modified(self):
+        url = reverse('post_detail', kwargs={'slug': self.post.slug})
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            .status_code,
+            304,
+        )
+
+        Comment.objects.create(
+            post=self.post,
+            author=self.author,
+            text='Comment',
+            published_at=timezone.now(),
+        )
+        # в TestCase коллбэки on_commit не вызываются, сбрасываем кэш сами
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+
+@blog_test_settings
+class ThumbnailTestCase(TestCase):
+    def test_missing_source_image(self):
+        image_hash = 'aa' + '0' * 38
+        post = Post.objects.create(
+            title='Post',
+            text='Lorem ipsum',
+            slug='post',
+            image='missing.jpg',
+            published_at=timezone.now(),
+            author=User.objects.create(username='author', is_staff=True),
+        )
+        Post.objects.filter(pk=post.pk).update(image_hash=image_hash)
+
+        url = reverse('thumbnail', kwargs={
+            'image_hash': image_hash,
+            'width': 360,
+            'extension': 'jpg',
+        })
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@blog_test_settings
+class CountersTestCase(TestCase):
+    '''
+    likes_count, comments_count, posts_count and the archive months
+    follow every change made through the ORM, see blog.signals
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', is_staff=True)
+        cls.readers = [
+            User.objects.create(username=f'reader{number}')
+            for number in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(title=f'tag{number}') for number in range(2)
+        ]
+        published_at = timezone.make_aware(datetime.datetime(2020, 5, 10))
+        create_post(cls.author, 'post', published_at)
+        create_post(cls.author, 'other', published_at)
+
+    def setUp(self):
+        # тесты удаляют объекты, поэтому каждый берёт свои копии
+        self.post = Post.objects.get(slug='post')
+        self.other_post = Post.objects.get(slug='other')
+        self.readers = list(
+            User.objects.filter(username__startswith='reader').order_by('id'))
+        self.tags = list(Tag.objects.all())
+
+    def assert_likes_count(self, post, likes_count):
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, likes_count)
+        self.assertEqual(post.likes_count, post.likes.count())
+
+    def assert_comments_count(self, post, comments_count):
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, comments_count)
+        self.assertEqual(post.comments_count, post.comments.count())
+
+    def assert_posts_count(self, tag, posts_count):
+        tag.refresh_from_db()
+        self.assertEqual(tag.posts_count, posts_count)
+        self.assertEqual(tag.posts_count, tag.posts.count())
+
+    def get_archive_count(self, year, month):
+        return ArchiveMonth.objects.filter(year=year, month=month)\
+            .values_list('posts_count', flat=True)\
+            .first()
+
+    def create_comment(self, post, author):
+        return Comment.objects.create(
+            post=post,
+            author=author,
+            text='Comment',
+            published_at=timezone.now(),
+        )
+
+    def test_likes_from_post_side(self):
+        self.post.likes.add(*self.readers)
+        self.assert_likes_count(self.post, 3)
+        # повторный лайк не считается
+        self.post.likes.add(self.readers[0])
+        self.assert_likes_count(self.post, 3)
+        self.post.likes.remove(self.readers[0])
+        self.assert_likes_count(self.post, 2)
+        self.post.likes.clear()
+        self.assert_likes_count(self.post, 0)
+
+    def test_likes_from_user_side(self):
+        reader = self.readers[0]
+        reader.liked_posts.add(self.post, self.other_post)
+        self.assert_likes_count(self.post, 1)
+        self.assert_likes_count(self.other_post, 1)
+        reader.liked_posts.remove(self.post)
+        self.assert_likes_count(self.post, 0)
+        self.assert_likes_count(self.other_post, 1)
+        reader.liked_posts.clear()
+        self.assert_likes_count(self.other_post, 0)
+
+    def test_tags_from_post_side(self):
+        self.post.tags.add(*self.tags)
+        self.assert_posts_count(self.tags[0], 1)
+        self.assert_posts_count(self.tags[1], 1)
+        self.post.tags.remove(self.tags[0])
+        self.assert_posts_count(self.tags[0], 0)
+        self.post.tags.clear()
+        self.assert_posts_count(self.tags[1], 0)
+
+    def test_tags_from_tag_side(self):
+        tag = self.tags[0]
+        tag.posts.add(self.post, self.other_post)
+        self.assert_posts_count(tag, 2)
+        tag.posts.remove(self.post)
+        self.assert_posts_count(tag, 1)
+        tag.posts.clear()
+        self.assert_posts_count(tag, 0)
+
+    def test_comments(self):
+        comment = self.create_comment(self.post, self.readers[0])
+        self.create_comment(self.post, self.readers[1])
+        self.assert_comments_count(self.post, 2)
+
+        comment.text = 'Edited'
+        comment.save()
+        self.assert_comments_count(self.post, 2)
+
+        comment.post = self.other_post
+        comment.save()
+        self.assert_comments_count(self.post, 1)
+        self.assert_comments_count(self.other_post, 1)
+
+        comment.delete()
+        self.assert_comments_count(self.other_post, 0)
+
+    def test_user_deletion(self):
+        reader = self.readers[0]
+        self.post.likes.add(reader, self.readers[1])
+        self.other_post.likes.add(reader)
+        self.create_comment(self.post, reader)
+        self.create_comment(self.post, self.readers[1])
+
+        reader.delete()
+        self.assert_likes_count(self.post, 1)
+        self.assert_likes_count(self.other_post, 0)
+        self.assert_comments_count(self.post, 1)
+
+    def test_post_deletion(self):
+        self.post.tags.add(*self.tags)
+        self.other_post.tags.add(self.tags[0])
+        self.assertEqual(self.get_archive_count(2020, 5), 2)
+
+        self.post.delete()
+        self.assert_posts_count(self.tags[0], 1)
+        self.assert_posts_count(self.tags[1], 0)
+        self.assertEqual(self.get_archive_count(2020, 5), 1)
+
+    def test_archive_months(self):
+        post = create_post(
+            self.author, 'archived',
+            timezone.make_aware(datetime.datetime(2019, 3, 5)))
+        self.assertEqual(self.get_archive_count(2019, 3), 1)
+
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(self.get_archive_count(2019, 3), 1)
+
+        post.published_at = timezone.make_aware(datetime.datetime(2018, 7, 5))
+        post.save()
+        self.assertEqual(self.get_archive_count(2019, 3), 0)
+        self.assertEqual(self.get_archive_count(2018, 7), 1)
+
+        post.delete()
+        self.assertEqual(self.get_archive_count(2018, 7), 0)
+
+
+@blog_test_settings
+class LikesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_superuser(
+            username='author', password='password', email='')
+        cls.reader = User.objects.create(username='reader')
+        cls.post = create_post(cls.author, 'post')
+
+    def assert_likes(self, user_ids):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(
+            set(post.likes.values_list('id', flat=True)), set(user_ids))
+        self.assertEqual(post.likes_count, len(user_ids))
+
+    def put_events(self, *events):
+        for liked in events:
+            like_events.put_nowait((self.post.pk, self.reader.pk, liked))
+
+    def test_last_event_of_pair_wins(self):
+        self.put_events(True, False)
+        flush_pending_events()
+        self.assert_likes([])
+
+        self.put_events(False, True)
+        flush_pending_events()
+        self.assert_likes([self.reader.pk])
+
+    @override_settings(LIKES_FLUSH_INTERVAL=0.01, LIKES_BATCH_SIZE=10)
+    def test_collect_events(self):
+        self.put_events(False, True)
+        events, taken_count = collect_events(
+            (self.post.pk, self.reader.pk, True))
+        for _ in range(taken_count - 1):
+            like_events.task_done()
+        self.assertEqual(taken_count, 3)
+        self.assertEqual(events, {(self.post.pk, self.reader.pk): True})
+
+    def test_duplicate_like(self):
+        apply_like_events({(self.post.pk, self.reader.pk): True})
+        apply_like_events({(self.post.pk, self.reader.pk): True})
+        self.assert_likes([self.reader.pk])
+
+    def test_likes_count_is_recounted(self):
+        Post.objects.filter(pk=self.post.pk).update(likes_count=42)
+        apply_like_events({
+            (self.post.pk, self.reader.pk): True,
+            (self.post.pk, self.author.pk): False,
+        })
+        self.assert_likes([self.reader.pk])
+
+    @mock.patch('blog.views.enqueue_like')
+    def test_like_post_answers(self, enqueue_like):
+        url = reverse('like_post', kwargs={'slug': self.post.slug})
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_login(self.reader)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'liked': True})
+        enqueue_like.assert_called_once_with(
+            self.post.pk, self.reader.pk, True)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'liked': False})
+        self.assertEqual(self.client.get(url).status_code, 405)
+        missing_url = reverse('like_post', kwargs={'slug': 'missing'})
+        self.assertEqual(self.client.post(missing_url).status_code, 404)
+
+        enqueue_like.side_effect = queue.Full
+        self.assertEqual(self.client.post(url).status_code, 503)
+
+    def test_admin_keeps_likes_count(self):
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('admin:blog_postlike_add'), {
+            'post': self.post.pk,
+            'user': self.reader.pk,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assert_likes([self.reader.pk])
+
+        like = PostLike.objects.get(post=self.post, user=self.reader)
+        url = reverse('admin:blog_postlike_delete', args=[like.pk])
+        response = self.client.post(url, {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assert_likes([])
+
+    def test_admin_bulk_delete_keeps_likes_count(self):
+        self.post.likes.add(self.reader, self.author)
+        self.client.force_login(self.author)
+        url = reverse('admin:blog_postlike_changelist')
+        response = self.client.post(url, {
+            'action': 'delete_selected',
+            '_selected_action': list(
+                PostLike.objects.values_list('pk', flat=True)),
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assert_likes([])
+
+
+@blog_test_settings
+class AdminPostTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', password='password', email='')
+        cls.reader = User.objects.create(username='reader')
+
+    def test_author_lookup_offers_only_staff(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:blog_post_add'))
+        lookup_url = reverse('admin:auth_user_changelist')
+        self.assertContains(
+            response, f'href="{lookup_url}?is_staff=1&amp;_to_field=id"')
+
+        response = self.client.get(lookup_url, {
+            'is_staff': 1, '_popup': 1, '_to_field': 'id'})
+        users = response.context['cl'].result_list
+        self.assertEqual(list(users), [self.admin])
+
+
+class BenchDatabaseTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.post = create_post(cls.author, 'post')
+
+    def test_writers_need_allow_writes(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_database', writers=1, duration=0)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_deletes_only_created_comments(self):
+        Comment.objects.create(
+            post=self.post, author=self.author, text=BENCH_COMMENT_TEXT,
+            published_at=timezone.now())
+        created_comment_ids = []
+        write_comment(self.post.pk, self.author.pk, created_comment_ids)
+        write_comment(self.post.pk, self.author.pk, created_comment_ids)
+
+        delete_comments(created_comment_ids, batch_size=1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Post.objects.get().comments_count, 1)
+
+
+@contextmanager
+def run_commit_callbacks():
+    '''
+    TestCase never commits, so callbacks of transaction.on_commit
+    are collected and called when the block ends
+    '''
+    callbacks = []
+    with mock.patch('django.db.transaction.on_commit',
+                    lambda func, using=None: callbacks.append(func)):
+        yield
+    for callback in callbacks:
+        callback()
+
+
+@blog_test_settings
+class PageCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', is_staff=True)
+        cls.tag = Tag.objects.create(title='tag')
+        cls.other_tag = Tag.objects.create(title='other')
+        cls.post = create_post(cls.author, 'post')
+        cls.other_post = create_post(cls.author, 'other')
+        cls.post.tags.set([cls.tag])
+        cls.other_post.tags.set([cls.other_tag])
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **headers):
+        '''
+        :return: (response, number of queries)
+        '''
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        return response, len(queries)
+
+    def assert_rendered(self, url):
+        response, queries_count = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries_count, 0)
+        return response
+
+    def assert_cached(self, url):
+        response, queries_count = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries_count, 0)
+        return response
+
+    def get_post_url(self, post):
+        return reverse('post_detail', kwargs={'slug': post.slug})
+
+    def get_tag_url(self, tag):
+        return reverse('tag_filter', kwargs={'tag_title': tag.title})
+
+    def test_anonymous_hit(self):
+        url = self.get_post_url(self.post)
+        rendered_response = self.assert_rendered(url)
+        cached_response = self.assert_cached(url)
+        self.assertEqual(cached_response.content, rendered_response.content)
+        self.assertEqual(cached_response['ETag'], rendered_response['ETag'])
+
+    def test_authenticated_request_bypasses_cache(self):
+        url = self.get_post_url(self.post)
+        self.assert_rendered(url)
+        self.client.force_login(self.author)
+        self.assert_rendered(url)
+        response = self.assert_rendered(url)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_not_modified(self):
+        url = self.get_post_url(self.post)
+        etag = self.assert_rendered(url)['ETag']
+        response, queries_count = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries_count, 0)
+
+        response, _ = self.get(url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def cache_pages(self, *urls):
+        for url in urls:
+            self.assert_rendered(url)
+            self.assert_cached(url)
+
+    def test_comment_resets_post_page(self):
+        post_url = self.get_post_url(self.post)
+        other_post_url = self.get_post_url(self.other_post)
+        self.cache_pages(post_url, other_post_url)
+
+        with run_commit_callbacks():
+            Comment.objects.create(
+                post=self.post,
+                author=self.author,
+                text='Fresh comment',
+                published_at=timezone.now(),
+            )
+        self.assertContains(self.assert_rendered(post_url), 'Fresh comment')
+        self.assert_cached(other_post_url)
+
+    def test_tag_change_resets_tag_pages(self):
+        post_url = self.get_post_url(self.post)
+        tag_url = self.get_tag_url(self.tag)
+        other_tag_url = self.get_tag_url(self.other_tag)
+        self.cache_pages(post_url, tag_url, other_tag_url)
+
+        with run_commit_callbacks():
+            self.other_post.tags.add(self.tag)
+        self.assertContains(
+            self.assert_rendered(tag_url), self.get_post_url(self.other_post))
+        self.assert_rendered(other_tag_url)
+        self.assert_cached(post_url)
+
+    def test_post_change_resets_its_pages(self):
+        index_url = reverse('index')
+        post_url = self.get_post_url(self.post)
+        tag_url = self.get_tag_url(self.tag)
+        other_tag_url = self.get_tag_url(self.other_tag)
+        self.cache_pages(index_url, post_url, tag_url, other_tag_url)
+
+        self.post.title = 'Renamed post'
+        with run_commit_callbacks():
+            self.post.save()
+        for url in (index_url, post_url, tag_url):
+            self.assertContains(self.assert_rendered(url), 'Renamed post')
+        self.assert_cached(other_tag_url)
+
+
+@blog_test_settings
+class SearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', is_staff=True)
+        cls.tag = Tag.objects.create(title='gardening')
+        post = create_post(cls.author, 'tomatoes', text='Grow tomatoes')
+        post.tags.set([cls.tag])
+
+    def setUp(self):
+        self.post = Post.objects.get(slug='tomatoes')
+        self.tag = Tag.objects.get(title='gardening')
+
+    def find_post_ids(self, query, per_page=20):
+        results, _ = search_posts(query, per_page)
+        return [post_id for post_id, _ in results]
+
+    def test_operators_in_query_are_text(self):
+        for query in ['"a" OR', '*', 'tomatoes OR', 'NEAR(', '-', '"']:
+            response = self.client.get(reverse('search'), {'q': query})
+            self.assertEqual(response.status_code, 200, query)
+        self.assertEqual(self.find_post_ids('*'), [])
+        self.assertEqual(self.find_post_ids('"tomatoes" OR'), [])
+        self.assertEqual(self.find_post_ids('"tomatoes"'), [self.post.pk])
+
+    def test_rank_cursor_pages(self):
+        for number in range(1, 7):
+            create_post(
+                self.author, f'ranked-{number}',
+                text=' '.join(['pepper'] * number + ['filler'] * 20))
+        all_post_ids = self.find_post_ids('pepper')
+        self.assertEqual(len(all_post_ids), 6)
+
+        paged_post_ids = []
+        after = None
+        while True:
+            results, after = search_posts('pepper', 4, after=after)
+            paged_post_ids.extend(post_id for post_id, _ in results)
+            if after is None:
+                break
+        self.assertEqual(paged_post_ids, all_post_ids)
+
+        response = self.client.get(
+            reverse('search'), {'q': 'pepper', 'after': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_index_follows_posts(self):
+        self.post.title = 'Cucumbers'
+        self.post.save()
+        self.assertEqual(self.find_post_ids('cucumbers'), [self.post.pk])
+
+        self.post.delete()
+        self.assertEqual(self.find_post_ids('cucumbers'), [])
+
+    def test_index_follows_tags(self):
+        self.assertEqual(self.find_post_ids('gardening'), [self.post.pk])
+
+        self.tag.title = 'farming'
+        self.tag.save()
+        self.assertEqual(self.find_post_ids('gardening'), [])
+        self.assertEqual(self.find_post_ids('farming'), [self.post.pk])
+
+        self.post.tags.add(Tag.objects.create(title='summer'))
+        self.assertEqual(self.find_post_ids('summer'), [self.post.pk])
+        self.post.tags.remove(self.tag)
+        self.assertEqual(self.find_post_ids('farming'), [])
+
+        with run_commit_callbacks():
+            Tag.objects.get(title='summer').delete()
+        self.assertEqual(self.find_post_ids('summer'), [])
+
+    def test_snippet_is_escaped(self):
+        post = create_post(
+            self.author, 'unsafe',
+            text='<script>alert(1)</script> beware of slugs & snails')
+        post.tags.set([self.tag])
+        results, _ = search_posts('slugs', 20)
+        [(_, snippet)] = results
+        self.assertIn('&lt;script&gt;', snippet)
+        self.assertIn('<mark>slugs</mark>', snippet)
+        self.assertIn('&amp;', snippet)
+        self.assertNotIn('<script>', snippet)
+
+        response = self.client.get(reverse('search'), {'q': 'slugs'})
+        self.assertContains(response, '<mark>slugs</mark>')
+        self.assertNotContains(response, '<script>alert(1)</script>')
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+@blog_test_settings
+class RequestMetricsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', is_staff=True)
+        post = create_post(author, 'post')
+        post.tags.set([Tag.objects.create(title='tag')])
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_queries_recorded(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="8 queries"', response['Server-Timing'])
+
+    def test_wsgi_request(self):
+        self.assert_queries_recorded(self.client.get(reverse('index')))
+
+    async def test_asgi_request_to_sync_view(self):
+        # синхронная вьюха под ASGI работает в потоке sync_to_async
+        response = await AsyncClient().get(reverse('index'))
+        self.assert_queries_recorded(response)
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from blog.models import Post
+
+
+# ширины карточек: боковая колонка, список постов, страница поста
+THUMBNAIL_WIDTHS = (360, 720, 1080)
+DEFAULT_THUMBNAIL_WIDTH = 720
+THUMBNAIL_FORMATS = {
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True,
+            'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+}
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_image_hash(file):
+    '''
+    Hash of the image content, the file position is restored
+    '''
+    digest = hashlib.sha1()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def get_thumbnail_name(image_hash, width, extension):
+    return f'{image_hash[:2]}/{image_hash}/{width}.{extension}'
+
+
+def get_thumbnail_path(image_hash, width, extension):
+    return os.path.join(
+        settings.THUMBNAIL_ROOT,
+        get_thumbnail_name(image_hash, width, extension),
+    )
+
+
+def get_thumbnail_url(image_hash, width, extension='jpg'):
+    return settings.THUMBNAIL_URL \
+        + get_thumbnail_name(image_hash, width, extension)
+
+
+def build_srcset(image_hash, extension='jpg'):
+    return ', '.join(
+        f'{get_thumbnail_url(image_hash, width, extension)} {width}w'
+        for width in THUMBNAIL_WIDTHS
+    )
+
+
+def serialize_image(image, image_hash):
+    '''
+    URLs of the original image and its thumbnails for templates and the API.
+    Images without a hash yet fall back to the original.
+    '''
+    if not image:
+        return {
+            'image_url': None,
+            'image_thumbnail_url': None,
+            'image_srcset': None,
+            'image_webp_srcset': None,
+        }
+    if not image_hash:
+        return {
+            'image_url': image.url,
+            'image_thumbnail_url': image.url,
+            'image_srcset': None,
+            'image_webp_srcset': None,
+        }
+    return {
+        'image_url': image.url,
+        'image_thumbnail_url': get_thumbnail_url(
+            image_hash, DEFAULT_THUMBNAIL_WIDTH),
+        'image_srcset': build_srcset(image_hash),
+        'image_webp_srcset': build_srcset(image_hash, 'webp'),
+    }
+
+
+def save_atomically(image, path, options):
+    '''
+    Write through a temporary file, so concurrent readers and
+    writers never see a half-written thumbnail
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            image.save(file, **options)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def open_source_image(file):
+    image = Image.open(file)
+    # фото с телефона хранят поворот в EXIF
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_thumbnails(file, image_hash, force=False):
+    '''
+    Render every width in every format, existing files are kept
+    :param file: path or file object of the original image
+    :return: number of written thumbnails
+    '''
+    missing = [
+        (width, extension)
+        for width in THUMBNAIL_WIDTHS
+        for extension in THUMBNAIL_FORMATS
+        if force or not os.path.exists(
+            get_thumbnail_path(image_hash, width, extension))
+    ]
+    if not missing:
+        return 0
+
+    source = open_source_image(file)
+    for width, extension in missing:
+        thumbnail = source.copy()
+        # картинки меньше нужной ширины не растягиваем
+        thumbnail.thumbnail((width, width * 10), Image.LANCZOS)
+        save_atomically(
+            thumbnail,
+            get_thumbnail_path(image_hash, width, extension),
+            THUMBNAIL_FORMATS[extension],
+        )
+    return len(missing)
+
+
+def ensure_thumbnails(image_name, image_hash, force=False):
+    '''
+    Render missing thumbnails of the image from the media storage
+    :return: number of written thumbnails
+    '''
+    with Post.image.field.storage.open(image_name, 'rb') as file:
+        return generate_thumbnails(file, image_hash, force=force)
@@ -0,0 +1,132 @@
+import datetime
+import math
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Func, Q
+from django.utils import timezone
+
+from blog.models import Comment, Post, PostLike
+
+
+# точка отсчёта должна оставаться прежней, иначе старые оценки не сравнить
+TRENDING_EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+HALF_LIFE_HOURS = 48
+POST_WEIGHT = 1.0
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 3.0
+POSTS_PER_TRANSACTION = 500
+# юлианский день TRENDING_EPOCH
+EPOCH_JULIAN_DAY = 2458849.5
+
+
+class JulianDay(Func):
+    '''
+    SQLite julianday(): the date as a float, read without parsing
+    a datetime object for every like and comment
+    '''
+    function = 'julianday'
+    output_field = FloatField()
+
+
+def get_epoch_hours(moment):
+    return (moment - TRENDING_EPOCH).total_seconds() / 3600
+
+
+def calculate_trending_score(events):
+    '''
+    Activity of the post decayed by half every HALF_LIFE_HOURS, in a log
+    scale: HALF_LIFE_HOURS * log2(sum of weight * 2 ** (hours / half-life)).
+    All posts decay at the same rate, so the order of the scores does not
+    change with time and a score has to be recomputed only on new activity.
+    A post without likes and comments scores the hours since TRENDING_EPOCH
+    of its publication, each doubling of the activity adds HALF_LIFE_HOURS.
+    :param events: list of (weight, hours since TRENDING_EPOCH)
+    '''
+    # считаем от самого свежего события, чтобы степени двойки не переполнились
+    latest_hours = max(hours for _, hours in events)
+    total_weight = sum(
+        weight * 2 ** ((hours - latest_hours) / HALF_LIFE_HOURS)
+        for weight, hours in events
+    )
+    return latest_hours + HALF_LIFE_HOURS * math.log2(total_weight)
+
+
+def get_julian_day_hours(julian_day):
+    return (julian_day - EPOCH_JULIAN_DAY) * 24
+
+
+def score_new_post(published_at):
+    return calculate_trending_score(
+        [(POST_WEIGHT, get_epoch_hours(published_at))])
+
+
+def load_post_events(post_ids):
+    '''
+    Publication, likes and comments of the posts, three queries in total
+    :return: dict {post id: list of (weight, hours since TRENDING_EPOCH)}
+    '''
+    sources = [
+        (POST_WEIGHT, Post.objects.filter(id__in=post_ids)
+         .values_list('id', JulianDay('published_at'))),
+        (LIKE_WEIGHT, PostLike.objects.filter(post_id__in=post_ids)
+         .values_list('post_id', JulianDay('liked_at'))),
+        (COMMENT_WEIGHT, Comment.objects.filter(post_id__in=post_ids)
+         .values_list('post_id', JulianDay('published_at'))),
+    ]
+    events = defaultdict(list)
+    for weight, rows in sources:
+        for post_id, julian_day in rows.order_by().iterator():
+            events[post_id].append((weight, get_julian_day_hours(julian_day)))
+    return events
+
+
+def fetch_outdated_post_ids():
+    '''
+    New posts and posts with likes or comments after the last computation
+    '''
+    outdated_posts = Post.objects.filter(
+        Q(trending_computed_at__isnull=True)
+        | Q(updated_at__gt=F('trending_computed_at'))
+    )
+    return set(outdated_posts.values_list('id', flat=True))
+
+
+def save_trending_scores(scores, computed_at):
+    # bulk_update собирает огромный CASE, executemany заметно быстрее;
+    # save() не вызывается, поэтому updated_at не меняется
+    computed_at = connection.ops.adapt_datetimefield_value(computed_at)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {Post._meta.db_table} '
+            'SET trending_score = %s, trending_computed_at = %s '
+            'WHERE id = %s',
+            [
+                (score, computed_at, post_id)
+                for post_id, score in scores.items()
+            ],
+        )
+
+
+def compute_trending(incremental=False):
+    '''
+    Store trending_score of every post or only of the outdated ones
+    :return: ids of recomputed posts
+    '''
+    # изменения во время расчёта подхватит следующий запуск
+    computed_at = timezone.now()
+    if incremental:
+        post_ids = sorted(fetch_outdated_post_ids())
+    else:
+        post_ids = list(
+            Post.objects.order_by('id').values_list('id', flat=True))
+
+    for start in range(0, len(post_ids), POSTS_PER_TRANSACTION):
+        batch_ids = post_ids[start:start + POSTS_PER_TRANSACTION]
+        events = load_post_events(batch_ids)
+        scores = {
+            post_id: calculate_trending_score(post_events)
+            for post_id, post_events in events.items()
+        }
+        save_trending_scores(scores, computed_at)
+    return post_ids
@@ -1,128 +1,417 @@
+import datetime
+import os
+import queue
+
+from asgiref.sync import sync_to_async
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotAllowed,
+    JsonResponse,
+)
 from django.shortcuts import render, get_object_or_404
-from blog.models import Comment, Post, Tag
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from blog.archive import is_valid_archive_date
+from blog.database import read_from_replica
+from blog.likes import enqueue_like
+from blog.models import Comment, Post, RelatedPost, Tag
+from blog.page_cache import cache_page_for_anonymous
+from blog.pagination import (
+    paginate_comments, paginate_posts, serialize_pagination,
+)
+from blog.related import RELATED_POSTS_COUNT
+from blog.serializers import (
+    serialize_comment_values, serialize_post, serialize_related_post,
+    serialize_tag,
+)
+from blog.search import search_posts
+from blog.sidebar import get_sidebar
+from blog.sitemaps import (
+    SITEMAP_SECTIONS, fetch_sitemap_shards, iterate_section_urls,
+    render_sitemap_index, render_urlset,
+)
+from blog.thumbnails import (
+    THUMBNAIL_FORMATS, THUMBNAIL_WIDTHS, ensure_thumbnails,
+    get_thumbnail_path, serialize_image,
+)
 
 
-def serialized_comment(comment):
-    return {
-        'text': comment.text,
-        'published_at': comment.published_at,
-        'author': comment.author.username,
-    }
+POSTS_PER_PAGE = 5
+TAG_POSTS_PER_PAGE = 20
+COMMENTS_PER_PAGE = 50
+SEARCH_RESULTS_PER_PAGE = 20
+ARCHIVE_POSTS_PER_PAGE = 20
 
 
-def serialize_post(post):
-    tags = post.tags_
-    return {
-        'title': post.title,
-        'teaser_text': post.text[:200],
-        'author': post.author.username,
-        'comments_amount': post.comments_count,
-        'image_url': post.image.url if post.image else None,
-        'published_at': post.published_at,
-        'slug': post.slug,
-        'tags': [serialize_tag(tag) for tag in tags],
-        'first_tag_title': tags[0].title,
-    }
+def fetch_comments_page(post_id, after=None):
+    comments, next_cursor = paginate_comments(
+        Comment.objects.filter(post_id=post_id),
+        COMMENTS_PER_PAGE,
+        after=after,
+    )
+    return [serialize_comment_values(comment) for comment in comments], \
+        next_cursor
 
 
-def serialize_tag(tag):
-    return {
-        'title': tag.title,
-        'posts_with_tag': tag.posts_count,
-    }
+def fetch_index_posts(request, page):
+    # карточкам хватает анонса, полный текст не читаем
+    all_posts = Post.objects.defer('text').prefetch_tags()
 
+    page_posts, next_cursor, previous_cursor = paginate_posts(
+        all_posts,
+        POSTS_PER_PAGE,
+        page=page,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    page_posts = page_posts.select_related('author')\
+        .fetch_with_comments_count()
 
-def index(request):
-    tags = Tag.objects.all().fetch_with_posts_count()
-    all_posts = Post.objects.all().prefetch_tags()
+    return {
+        'page_posts': [serialize_post(post) for post in page_posts],
+        'pagination': serialize_pagination(
+            'index', page, next_cursor, previous_cursor),
+    }
 
-    most_popular_posts = all_posts.popular()[:5] \
-        .prefetch_related('tags', 'comments', 'author')\
-        .fetch_with_comments_count()
 
-    most_fresh_posts = all_posts.order_by('-published_at')[:5]\
-        .prefetch_related('tags', 'comments', 'author') \
-        .fetch_with_comments_count()
+cache_index_page = cache_page_for_anonymous(
+    get_groups=lambda **kwargs: ['index'],
+    get_last_modified=lambda **kwargs: Post.objects.fetch_last_updated_at(),
+)
 
-    most_popular_tags = tags.popular()[:5].fetch_with_posts_count()
 
+@read_from_replica
+@cache_index_page
+def index(request, page=1):
     context = {
-        'most_popular_posts': [
-            serialize_post(post) for post in most_popular_posts
-        ],
-        'page_posts': [serialize_post(post) for post in most_fresh_posts],
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
+        **get_sidebar(),
+        **fetch_index_posts(request, page),
     }
     return render(request, 'index.html', context)
 
 
-def post_detail(request, slug):
-    tags = Tag.objects.all().fetch_with_posts_count()
+def fetch_post(slug):
+    posts = Post.objects.select_related('author').prefetch_tags()
+    return get_object_or_404(posts, slug=slug)
+
+
+def fetch_is_liked(request, post_id):
+    '''
+    :return: None for anonymous users
+    '''
+    if not request.user.is_authenticated:
+        return None
+    return Post.likes.through.objects\
+        .filter(post_id=post_id, user_id=request.user.id)\
+        .exists()
 
-    posts = Post.objects.all()\
-        .fetch_likes_count()\
-        .prefetch_tags()\
-        .prefetch_related('tags', 'author', 'comments')
 
-    post = get_object_or_404(posts, slug=slug)
-    comments = post.comments.all().prefetch_related('author')
-    serialized_comments = [serialized_comment(comment) for comment in comments]
+def fetch_related_posts(post_id):
+    related_links = RelatedPost.objects.filter(post_id=post_id)\
+        .select_related('related_post')\
+        .defer('related_post__text')[:RELATED_POSTS_COUNT]
+    return [
+        serialize_related_post(link.related_post) for link in related_links
+    ]
 
-    related_tags = post.tags.all().fetch_with_posts_count()
 
+def serialize_post_details(post, comments_page, is_liked):
+    serialized_comments, comments_next_cursor = comments_page
     serialized_post = {
         'title': post.title,
         'text': post.text,
         'author': post.author.username,
         'comments': serialized_comments,
-        'likes_amount': post.likes__count,
-        'image_url': post.image.url if post.image else None,
+        'comments_amount': post.comments_count,
+        'comments_next_cursor': comments_next_cursor,
+        'likes_amount': post.likes_count,
+        **serialize_image(post.image, post.image_hash),
         'published_at': post.published_at,
         'slug': post.slug,
-        'tags': [serialize_tag(tag) for tag in related_tags],
+        'tags': [serialize_tag(tag) for tag in post.tags_],
     }
+    if is_liked is not None:
+        serialized_post['is_liked'] = is_liked
+    return serialized_post
+
+
+cache_post_page = cache_page_for_anonymous(
+    get_groups=lambda slug: [f'post:{slug}'],
+    get_last_modified=lambda slug: Post.objects.filter(slug=slug)
+    .fetch_last_updated_at(),
+)
 
-    most_popular_tags = tags.popular()[:5].prefetch_related('posts').fetch_with_posts_count()
 
-    most_popular_posts = posts.popular()[:5].fetch_with_comments_count()
+@read_from_replica
+@cache_post_page
+def post_detail(request, slug):
+    post = fetch_post(slug)
+    comments_page = fetch_comments_page(
+        post.id, after=request.GET.get('comments_after'))
+    is_liked = fetch_is_liked(request, post.id)
 
     context = {
-        'post': serialized_post,
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
-        'most_popular_posts': [
-            serialize_post(post) for post in most_popular_posts
-        ],
+        **get_sidebar(),
+        'post': serialize_post_details(post, comments_page, is_liked),
+        'related_posts': fetch_related_posts(post.id),
     }
     return render(request, 'post-details.html', context)
 
 
-def tag_filter(request, tag_title):
-    tags = Tag.objects.all().fetch_with_posts_count()
-    posts = Post.objects.all().prefetch_tags()
+def get_user_id(request):
+    return request.user.id if request.user.is_authenticated else None
 
-    tag = get_object_or_404(tags, title=tag_title)
-    most_popular_tags = tags.popular()[:5].prefetch_related('posts')
 
-    most_popular_posts = posts.popular()[:5]\
-        .prefetch_related('tags', 'author', 'comments')\
-        .fetch_with_comments_count()
+def get_post_id(slug):
+    return Post.objects.filter(slug=slug)\
+        .values_list('id', flat=True)\
+        .first()
+
+
+def post_comments(request, slug):
+    post_id = get_post_id(slug)
+    if post_id is None:
+        raise Http404('Пост не найден')
+
+    comments, next_cursor = fetch_comments_page(
+        post_id, after=request.GET.get('after'))
+    return JsonResponse({
+        'comments': comments,
+        'next_cursor': next_cursor,
+    })
+
+
+async def like_post(request, slug):
+    '''
+    POST likes the post, DELETE takes the like back.
+    The like is written to the database later by the flusher thread.
+    '''
+    if request.method not in ('POST', 'DELETE'):
+        return HttpResponseNotAllowed(['POST', 'DELETE'])
+
+    # сессия и база синхронные, их нельзя трогать прямо из корутины
+    user_id = await sync_to_async(get_user_id)(request)
+    if user_id is None:
+        return JsonResponse({'error': 'Войдите, чтобы ставить лайки'},
+                            status=403)
+    post_id = await sync_to_async(get_post_id)(slug)
+    if post_id is None:
+        raise Http404('Пост не найден')
 
-    related_posts = tag.posts.all()[:20]\
+    liked = request.method == 'POST'
+    try:
+        enqueue_like(post_id, user_id, liked)
+    except queue.Full:
+        return JsonResponse({'error': 'Слишком много лайков, повторите позже'},
+                            status=503)
+    return JsonResponse({'liked': liked}, status=202)
+
+
+def fetch_tag_posts(request, tag_title, page):
+    tag = get_object_or_404(Tag.objects.all(), title=tag_title)
+
+    related_posts, next_cursor, previous_cursor = paginate_posts(
+        tag.posts.defer('text'),
+        TAG_POSTS_PER_PAGE,
+        page=page,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    related_posts = related_posts\
         .prefetch_tags()\
-        .prefetch_related('tags', 'author', 'comments')\
+        .select_related('author')\
         .fetch_with_comments_count()
 
-    context = {
+    return {
         'tag': tag.title,
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
         'posts': [serialize_post(post) for post in related_posts],
-        'most_popular_posts': [
-            serialize_post(post) for post in most_popular_posts
-        ],
+        'pagination': serialize_pagination(
+            'tag_filter', page, next_cursor, previous_cursor,
+            tag_title=tag.title),
+    }
+
+
+cache_tag_page = cache_page_for_anonymous(
+    get_groups=lambda tag_title, **kwargs: [f'tag:{tag_title}'],
+    get_last_modified=lambda tag_title, **kwargs: Post.objects
+    .filter(tags__title=tag_title).fetch_last_updated_at(),
+)
+
+
+@read_from_replica
+@cache_tag_page
+def tag_filter(request, tag_title, page=1):
+    context = {
+        **get_sidebar(),
+        **fetch_tag_posts(request, tag_title, page),
+    }
+    return render(request, 'posts-list.html', context)
+
+
+def fetch_archive_posts(request, year, month, page):
+    if not is_valid_archive_date(year, month):
+        raise Http404('Нет такого месяца')
+
+    archive_posts, next_cursor, previous_cursor = paginate_posts(
+        Post.objects.published_in(year, month).defer('text'),
+        ARCHIVE_POSTS_PER_PAGE,
+        page=page,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    archive_posts = archive_posts\
+        .prefetch_tags()\
+        .select_related('author')\
+        .fetch_with_comments_count()
+
+    url_kwargs = {'year': year}
+    if month is not None:
+        url_kwargs['month'] = month
+    return {
+        'archive': {
+            'year': year,
+            'month': month,
+            'date': datetime.date(year, month or 1, 1),
+        },
+        'posts': [serialize_post(post) for post in archive_posts],
+        'pagination': serialize_pagination(
+            'archive', page, next_cursor, previous_cursor, **url_kwargs),
+    }
+
+
+# месяцы года сбрасываются вместе с годом, см. collect_post_page_groups
+cache_archive_page = cache_page_for_anonymous(
+    get_groups=lambda year, **kwargs: [f'archive:{year}'],
+    get_last_modified=lambda year, month=None, **kwargs: Post.objects
+    .published_in(year, month).fetch_last_updated_at(),
+)
+
+
+@read_from_replica
+@cache_archive_page
+def archive(request, year, month=None, page=1):
+    context = {
+        **get_sidebar(),
+        **fetch_archive_posts(request, year, month, page),
+    }
+    return render(request, 'posts-list.html', context)
+
+
+@read_from_replica
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page = request.GET.get('page', '1')
+    page = int(page) if page.isdigit() else 1
+
+    results, next_cursor = search_posts(
+        query,
+        SEARCH_RESULTS_PER_PAGE,
+        after=request.GET.get('after'),
+    )
+    snippets = dict(results)
+    positions = {
+        post_id: position for position, (post_id, _) in enumerate(results)
+    }
+    found_posts = Post.objects.filter(id__in=snippets)\
+        .defer('text')\
+        .prefetch_tags()\
+        .select_related('author')\
+        .fetch_with_comments_count()
+    found_posts = sorted(found_posts, key=lambda post: positions[post.id])
+
+    serialized_posts = []
+    for post in found_posts:
+        serialized_post = serialize_post(post)
+        serialized_post['snippet'] = snippets[post.id]
+        serialized_posts.append(serialized_post)
+
+    next_url = None
+    if next_cursor:
+        next_url = '{}?{}'.format(reverse('search'), urlencode({
+            'q': query,
+            'after': next_cursor,
+            'page': page + 1,
+        }))
+
+    context = {
+        **get_sidebar(),
+        'query': query,
+        'posts': serialized_posts,
+        'pagination': {
+            'number': page,
+            'previous_url': None,
+            'next_url': next_url,
+        },
     }
     return render(request, 'posts-list.html', context)
 
 
+def get_base_url(request):
+    return request.build_absolute_uri('/').rstrip('/')
+
+
+cache_sitemap_index = cache_page_for_anonymous(
+    get_groups=lambda: ['sitemap'],
+    get_last_modified=lambda: Post.objects.fetch_last_updated_at(),
+)
+
+
+@read_from_replica
+@cache_sitemap_index
+def sitemap_index(request):
+    content = ''.join(
+        render_sitemap_index(get_base_url(request), fetch_sitemap_shards()))
+    return HttpResponse(content, content_type='application/xml')
+
+
+# части сбрасываются по одной, см. collect_post_page_groups
+cache_sitemap_section = cache_page_for_anonymous(
+    get_groups=lambda section, number: [f'sitemap:{section}-{number}'],
+    get_last_modified=lambda section, number: None,
+)
+
+
+@read_from_replica
+@cache_sitemap_section
+def sitemap_section(request, section, number):
+    if section not in SITEMAP_SECTIONS or section == 'pages' and number:
+        raise Http404('Нет такой части карты сайта')
+
+    urls = iterate_section_urls(section, number)
+    content = ''.join(render_urlset(get_base_url(request), urls))
+    if '<url>' not in content:
+        raise Http404('Нет такой части карты сайта')
+    return HttpResponse(content, content_type='application/xml')
+
+
+def thumbnail(request, image_hash, width, extension):
+    '''
+    Fallback for thumbnails that are not on disk yet,
+    existing files are served by the web server
+    '''
+    width = int(width)
+    if width not in THUMBNAIL_WIDTHS or extension not in THUMBNAIL_FORMATS:
+        raise Http404('Нет такого размера картинки')
+    path = get_thumbnail_path(image_hash, width, extension)
+    if not os.path.exists(path):
+        image_name = Post.objects.filter(image_hash=image_hash)\
+            .values_list('image', flat=True)\
+            .first()
+        if not image_name:
+            raise Http404('Картинка не найдена')
+        try:
+            ensure_thumbnails(image_name, image_hash)
+        except OSError:
+            # исходник пропал из хранилища или не читается как картинка
+            raise Http404('Картинка не найдена')
+
+    response = FileResponse(open(path, 'rb'))
+    # имя файла содержит хэш картинки, поэтому кэшируем навсегда
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60,
+                        immutable=True)
+    return response
+
+
 def contacts(request):
     # позже здесь будет код для статистики заходов на эту страницу
     # и для записи фидбека
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from environs import Env
 
 env = Env()
@@ -20,12 +21,10 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
-    'blog',
+    'blog.apps.BlogConfig',
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -33,19 +32,40 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blog.middleware.RequestMetricsMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+REQUEST_METRICS_SAMPLE_RATE = env.float('REQUEST_METRICS_SAMPLE_RATE', 0.1)
+
 ROOT_URLCONF = 'sensive_blog.urls'
 
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
-STATIC_ROOT = ''
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'blog.staticfiles.BundleFinder',
+]
+# статика с хэшами в именах берётся из манифеста, который создаёт
+# build_static, поэтому включать её стоит только на боевом сервере
+STATIC_MANIFEST_STORAGE = env.bool('STATIC_MANIFEST_STORAGE', False)
+if STATIC_MANIFEST_STORAGE:
+    STATICFILES_STORAGE = 'blog.staticfiles.BundledStaticFilesStorage'
+STATIC_ROOT = env.str(
+    'STATIC_ROOT', os.path.join(BASE_DIR, 'collected_static'))
+STATIC_BUNDLES_ROOT = env.str(
+    'STATIC_BUNDLES_ROOT',
+    os.path.join(tempfile.gettempdir(), 'sensive_blog_bundles'))
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'blog.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATE_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -60,15 +80,68 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'sensive_blog.wsgi.application'
+ASGI_APPLICATION = 'sensive_blog.asgi.application'
+# асинхронные версии страниц блога, asgi.py включает их по умолчанию
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', False)
+
+# профиль для продакшена: WAL, чтобы читатели не ждали писателя,
+# и постоянные соединения вместо нового на каждый запрос
+SQLITE_PRODUCTION_PROFILE = env.bool('SQLITE_PRODUCTION_PROFILE', False)
+
+# прагмы выполняются на каждом новом соединении, см. blog.database
+SQLITE_PRAGMAS = {}
+if SQLITE_PRODUCTION_PROFILE:
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        # отрицательный cache_size задаётся в килобайтах
+        'cache_size': -env.int('SQLITE_CACHE_SIZE_KB', 64 * 1024),
+        'mmap_size': env.int('SQLITE_MMAP_SIZE_MB', 256) * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+
+DATABASE_SETTINGS = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'CONN_MAX_AGE': env.int(
+        'DATABASE_CONN_MAX_AGE', 600 if SQLITE_PRODUCTION_PROFILE else 0),
+    'OPTIONS': {
+        # сколько секунд ждать, пока база занята другим писателем
+        'timeout': env.float(
+            'DATABASE_BUSY_TIMEOUT', 20 if SQLITE_PRODUCTION_PROFILE else 5),
+    },
+}
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        **DATABASE_SETTINGS,
         'NAME': env.str(
             'DATABASE_FILEPATH', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
+# копия базы для страниц блога, её обновляет команда sync_replica
+DATABASE_REPLICA_FILEPATH = env.str('DATABASE_REPLICA_FILEPATH', None)
+if DATABASE_REPLICA_FILEPATH:
+    DATABASES['replica'] = {
+        **DATABASE_SETTINGS,
+        'NAME': DATABASE_REPLICA_FILEPATH,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['blog.database.ReplicaRouter']
+
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+
+SIDEBAR_CACHE_TTL = env.int('SIDEBAR_CACHE_TTL', 60)
+
+PAGE_CACHE_TTL = env.int('PAGE_CACHE_TTL', 60)
+
+# лайки копятся в памяти процесса и пишутся в базу пачками
+LIKES_QUEUE_SIZE = env.int('LIKES_QUEUE_SIZE', 10000)
+LIKES_BATCH_SIZE = env.int('LIKES_BATCH_SIZE', 500)
+LIKES_FLUSH_INTERVAL = env.float('LIKES_FLUSH_INTERVAL', 1.0)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',  # noqa: E501
@@ -96,9 +169,31 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+STATIC_EXPORT_ROOT = env.str(
+    'STATIC_EXPORT_ROOT', os.path.join(BASE_DIR, 'export'))
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+THUMBNAIL_ROOT = os.path.join(MEDIA_ROOT, 'thumbs')
+THUMBNAIL_URL = f'{MEDIA_URL}thumbs/'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'blog': {
+            'handlers': ['console'],
+            'level': env.str('BLOG_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -1,17 +1,86 @@
 from django.contrib import admin
-from blog import views
-from django.urls import path, include
+from blog import api, async_views, feeds, views
+from django.urls import path, include, re_path
 
 from django.conf.urls.static import static
 from django.conf import settings
 
+page_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('page/<int:page>', views.index, name='index'),
-    path('post/<slug:slug>', views.post_detail, name='post_detail'),
-    path('tag/<slug:tag_title>', views.tag_filter, name='tag_filter'),
+    path('page/<int:page>', page_views.index, name='index'),
+    path('post/<slug:slug>', page_views.post_detail, name='post_detail'),
+    path(
+        'post/<slug:slug>/comments',
+        views.post_comments,
+        name='post_comments',
+    ),
+    path('post/<slug:slug>/like', views.like_post, name='like_post'),
+    path('tag/<slug:tag_title>', page_views.tag_filter, name='tag_filter'),
+    path(
+        'tag/<slug:tag_title>/page/<int:page>',
+        page_views.tag_filter,
+        name='tag_filter',
+    ),
+    path('feed/', feeds.latest_posts_feed, name='feed'),
+    path('feed/atom/', feeds.latest_posts_atom_feed, name='atom_feed'),
+    path(
+        'tag/<slug:tag_title>/feed/',
+        feeds.tag_posts_feed,
+        name='tag_feed',
+    ),
+    path(
+        'tag/<slug:tag_title>/feed/atom/',
+        feeds.tag_posts_atom_feed,
+        name='tag_atom_feed',
+    ),
+    path('archive/<int:year>', page_views.archive, name='archive'),
+    path(
+        'archive/<int:year>/page/<int:page>',
+        page_views.archive,
+        name='archive',
+    ),
+    path(
+        'archive/<int:year>/<int:month>',
+        page_views.archive,
+        name='archive',
+    ),
+    path(
+        'archive/<int:year>/<int:month>/page/<int:page>',
+        page_views.archive,
+        name='archive',
+    ),
+    path('sitemap.xml', views.sitemap_index, name='sitemap'),
+    path(
+        'sitemap-<slug:section>-<int:number>.xml',
+        views.sitemap_section,
+        name='sitemap_section',
+    ),
+    path('search', views.search, name='search'),
     path('contacts/', views.contacts, name='contacts'),
-    path('', views.index, name='index'),
-    path('__debug__/', include('debug_toolbar.urls')),
+    path('api/posts', api.posts_list, name='api_posts'),
+    path('api/posts/<slug:slug>', api.post_detail, name='api_post_detail'),
+    path(
+        'api/posts/<slug:slug>/comments',
+        api.comments_list,
+        name='api_post_comments',
+    ),
+    path(
+        'api/tags/<slug:tag_title>/posts',
+        api.tag_posts_list,
+        name='api_tag_posts',
+    ),
+    path('', page_views.index, name='index'),
+    re_path(
+        r'^{}[0-9a-f]{{2}}/(?P<image_hash>[0-9a-f]{{40}})/'
+        r'(?P<width>[0-9]+)\.(?P<extension>[a-z]+)$'.format(
+            settings.THUMBNAIL_URL.lstrip('/')),
+        views.thumbnail,
+        name='thumbnail',
+    ),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if settings.DEBUG:
+    urlpatterns.append(path('__debug__/', include('debug_toolbar.urls')))
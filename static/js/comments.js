@@ -0,0 +1,39 @@
+$(function() {
+  "use strict";
+
+  var loadMoreButton = $('#load-more-comments');
+  var commentList = $('#comment-list');
+
+  function renderComment(comment) {
+    var commentBlock = $(
+      '<div class="single-comment justify-content-between d-flex" style="margin-bottom: 15px;">' +
+        '<div class="user justify-content-between d-flex">' +
+          '<div class="thumb"><img src="#" alt=""></div>' +
+          '<div class="desc">' +
+            '<h5><a href="#"></a></h5>' +
+            '<p class="date"></p>' +
+            '<p class="comment"></p>' +
+          '</div>' +
+        '</div>' +
+      '</div>'
+    );
+    commentBlock.find('h5 a').text(comment.author);
+    commentBlock.find('.date').text(new Date(comment.published_at).toLocaleString());
+    commentBlock.find('.comment').text(comment.text);
+    return commentBlock;
+  }
+
+  loadMoreButton.on('click', function(event) {
+    event.preventDefault();
+    $.getJSON(loadMoreButton.data('url'), {after: loadMoreButton.data('cursor')}, function(response) {
+      $.each(response.comments, function(index, comment) {
+        commentList.append(renderComment(comment));
+      });
+      if (response.next_cursor) {
+        loadMoreButton.data('cursor', response.next_cursor);
+      } else {
+        loadMoreButton.remove();
+      }
+    });
+  });
+});
@@ -0,0 +1,27 @@
+$(function() {
+  "use strict";
+
+  var likeButton = $('#like-button');
+  if (!likeButton.length) {
+    return;
+  }
+
+  likeButton.on('click', function(event) {
+    event.preventDefault();
+    var liked = likeButton.data('liked');
+    var likesAmount = likeButton.data('likes-amount');
+
+    $.ajax({
+      url: likeButton.data('url'),
+      type: liked ? 'DELETE' : 'POST',
+      headers: {'X-CSRFToken': likeButton.data('csrf-token')}
+    }).done(function(response) {
+      // лайк запишется в базу через секунду, счётчик обновляем сразу
+      likesAmount += response.liked ? 1 : -1;
+      likeButton.data('liked', response.liked);
+      likeButton.data('likes-amount', likesAmount);
+      likeButton.find('.likes-amount').text(likesAmount);
+      likeButton.find('i').attr('class', response.liked ? 'fas fa-heart' : 'ti-heart');
+    });
+  });
+});